@@ -0,0 +1,396 @@
+"""
+BFSI Call Center AI - Pipeline Load Test and Benchmark
+Replays query mixes built from the Alpaca BFSI dataset against BFSIOrchestrator
+and reports throughput, per-tier latency percentiles, the tier each query kind
+was actually routed to, cold vs warm start and peak RSS. Results are written as
+JSON so runs can be compared across commits.
+
+Dataset queries replay the text Tier 1 indexes (instruction + input), so they
+are expected to match. Request order: workload[0] is the cold-start query,
+the next --warmup requests warm up sequentially, and the following --requests
+requests are measured; none of the warm-up requests are in the results.
+
+Usage:
+  python scripts/benchmark_pipeline.py --requests 200 --concurrency 4
+  python scripts/benchmark_pipeline.py --stub --output bench.json   # fast, offline CI run
+"""
+
+import argparse
+import json
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+
+
+# Queries that are BFSI-flavoured but have no counterpart in the dataset
+OUT_OF_DATASET_QUERIES = [
+    "Can I get a loan to buy a used tractor for my farm?",
+    "Do you offer gold loans against jewellery?",
+    "How do I link my loan account to a new mobile number?",
+    "Is there a student loan for studying abroad?",
+    "Can NRIs open a recurring deposit online?",
+    "What happens to my loan if I change jobs?",
+    "How can I get a duplicate repayment schedule?",
+    "Can I add my spouse as a nominee on my deposit?",
+    "What is the weather like tomorrow?",
+    "Recommend a good movie to watch tonight.",
+]
+
+# Queries that trigger the RAG tier (complex financial / policy topics)
+POLICY_QUERIES = [
+    "Explain the interest rate framework for home loans.",
+    "How does the EMI formula split principal and interest component?",
+    "What late payment charge applies after the grace period?",
+    "What foreclosure charge applies to a fixed rate loan?",
+    "How is the processing fee decided for a vehicle loan?",
+    "What is your grievance redressal policy?",
+    "Which KYC documents are mandatory under regulatory guidelines?",
+    "How does a repo rate change affect fixed vs floating loans?",
+    "Explain the prepayment charge policy for personal loans.",
+    "How is compound interest applied on overdue amounts?",
+]
+
+_PARAPHRASE_PREFIXES = [
+    "Could you tell me ",
+    "I would like to know ",
+    "Please help: ",
+    "Quick question - ",
+    "",
+]
+
+_PARAPHRASE_SWAPS = [
+    ("How do I", "What is the way to"),
+    ("What is", "Tell me"),
+    ("Can I", "Is it possible to"),
+    ("my", "our"),
+    ("loan", "credit"),
+    ("check", "find out"),
+]
+
+
+def load_dataset_queries(path: Path) -> List[str]:
+    """Load the Tier-1 search text (instruction + input, as indexed) of each Alpaca dataset entry."""
+    from src.dataset_similarity import DatasetSimilarityChecker
+    from src.response_store import iter_records
+
+    queries = []
+    for item in iter_records(path):
+        q = DatasetSimilarityChecker.search_text(
+            (item.get("instruction") or "").strip(), (item.get("input") or "").strip()
+        )
+        if q:
+            queries.append(q)
+    return queries
+
+
+def paraphrase(query: str, rng: random.Random) -> str:
+    """Cheap rule-based paraphrase that keeps intent but changes surface form."""
+    text = query
+    for src, dst in rng.sample(_PARAPHRASE_SWAPS, k=2):
+        text = text.replace(src, dst, 1)
+    prefix = rng.choice(_PARAPHRASE_PREFIXES)
+    if prefix:
+        text = prefix + text[:1].lower() + text[1:]
+    if rng.random() < 0.5:
+        text = text.rstrip("?.") + "?"
+    return text
+
+
+def build_workload(dataset_queries: List[str], mix: Dict[str, float], n: int, seed: int) -> List[dict]:
+    """Build a shuffled list of {"kind", "query"} items following the requested mix."""
+    rng = random.Random(seed)
+    kinds = list(mix.keys())
+    weights = [mix[k] for k in kinds]
+    workload = []
+    for _ in range(n):
+        kind = rng.choices(kinds, weights=weights, k=1)[0]
+        if kind == "dataset":
+            query = rng.choice(dataset_queries)
+        elif kind == "paraphrase":
+            query = paraphrase(rng.choice(dataset_queries), rng)
+        elif kind == "ood":
+            query = rng.choice(OUT_OF_DATASET_QUERIES)
+        elif kind == "policy":
+            query = rng.choice(POLICY_QUERIES)
+        else:
+            raise ValueError(f"Unknown query kind in mix: {kind}")
+        workload.append({"kind": kind, "query": query})
+    return workload
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse 'dataset=0.6,paraphrase=0.2,...' into a weight dict."""
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        key, _, value = part.partition("=")
+        mix[key.strip()] = float(value)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"Invalid mix: {spec}")
+    return mix
+
+
+class StubSLM:
+    """
+    Stand-in for SLMInference that sleeps for a fixed per-token cost instead of decoding.
+    Byte-level "tokens" keep prompt assembly and context budgeting on the real code path.
+    """
+
+    def __init__(self, max_new_tokens: int = 256, ms_per_token: float = 0.0):
+        self.max_new_tokens = max_new_tokens
+        self.ms_per_token = ms_per_token
+        self.version = SimpleNamespace(tag="stub")
+
+    def current_version(self):
+        return self.version
+
+    @contextmanager
+    def pinned(self):
+        yield self.version
+
+    def encode_continuation(self, text: str) -> List[int]:
+        return list(text.encode("utf-8"))
+
+    segment_ids = encode_continuation
+
+    def build_prompt_ids(self, segments) -> List[int]:
+        return [1] + [int(t) for segment in segments for t in segment]
+
+    def generate(self, query: str, **kwargs) -> str:
+        tokens = int(kwargs.get("max_new_tokens") or self.max_new_tokens)
+        if self.ms_per_token:
+            time.sleep(tokens * self.ms_per_token / 1000.0)
+        return "Thank you for your query. Please contact our official channels for details."
+
+    def generate_ids(self, prompt_ids: List[int], query: str = "", **kwargs) -> str:
+        return self.generate(query, **kwargs)
+
+
+def stub_config(config_path: Optional[str], work_dir: Path) -> str:
+    """
+    Copy of the config whose audit log and Tier-1 index cache live in work_dir, so stub
+    runs never append synthetic queries to the compliance log or rebuild shared embeddings.
+    """
+    path = Path(config_path) if config_path else _PROJECT_ROOT / "config" / "settings.yaml"
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg.setdefault("audit", {})["path"] = str(work_dir / "audit.jsonl")
+    cfg.setdefault("similarity", {})["store_path"] = str(work_dir / "index" / "alpaca_store")
+    out = work_dir / "settings.yaml"
+    with open(out, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f)
+    return str(out)
+
+
+def build_orchestrator(config_path: Optional[str], stub: bool, stub_ms_per_token: float,
+                       work_dir: Optional[Path] = None):
+    """
+    Construct the orchestrator, swapping in stub models when requested.
+    Stub runs need work_dir for their audit log and index (see stub_config).
+    """
+    from src.embeddings import get_encoder
+    from src.orchestrator import BFSIOrchestrator
+
+    if stub:
+        config_path = stub_config(config_path, work_dir)
+    orch = BFSIOrchestrator(config_path)
+    if stub:
+        encoder = get_encoder("hash:384")
+        orch.dataset._model = encoder
+        orch.rag._model = encoder
+        orch.slm = StubSLM(orch.slm.max_new_tokens, stub_ms_per_token)
+        orch.rag.tokenize_chunks(orch.slm.encode_continuation, orch.slm.version.tag)  # as the version hook would
+    return orch
+
+
+def percentiles(samples_ms: List[float]) -> dict:
+    """Summary statistics for a list of latencies in milliseconds."""
+    if not samples_ms:
+        return {"count": 0}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=str(_PROJECT_ROOT),
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_workload(orch, workload: List[dict], concurrency: int, deadline_ms: Optional[float] = None) -> dict:
+    """Replay workload at the given concurrency; return raw per-request records and wall time."""
+    records = []
+    lock = threading.Lock()
+
+    def one(item: dict):
+        start = time.perf_counter()
+        error = None
+        tier = None
+        admission = None
+        try:
+            result = orch.process(item["query"], deadline_ms=deadline_ms)
+            tier = result.get("metadata", {}).get("tier") or result.get("source")
+            admission = result.get("metadata", {}).get("admission")
+        except Exception as e:  # recorded, not raised: a load test should survive bad requests
+            error = f"{type(e).__name__}: {e}"
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with lock:
+            records.append({"kind": item["kind"], "tier": tier, "admission": admission,
+                            "latency_ms": elapsed_ms, "error": error})
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, workload))
+    wall_s = time.perf_counter() - wall_start
+    return {"records": records, "wall_s": wall_s}
+
+
+def summarize(records: List[dict], wall_s: float) -> dict:
+    ok = [r for r in records if r["error"] is None]
+    by_tier: Dict[str, List[float]] = {}
+    by_kind: Dict[str, Dict[str, int]] = {}
+    admission: Dict[str, int] = {}
+    for r in ok:
+        if r.get("admission"):
+            admission[r["admission"]] = admission.get(r["admission"], 0) + 1
+        by_tier.setdefault(r["tier"] or "unknown", []).append(r["latency_ms"])
+        kinds = by_kind.setdefault(r["kind"], {})
+        kinds[r["tier"] or "unknown"] = kinds.get(r["tier"] or "unknown", 0) + 1
+    errors = [r["error"] for r in records if r["error"] is not None]
+    return {
+        "requests": len(records),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": wall_s,
+        "throughput_rps": len(ok) / wall_s if wall_s > 0 else 0.0,
+        "overall": percentiles([r["latency_ms"] for r in ok]),
+        "tiers": {tier: percentiles(lat) for tier, lat in sorted(by_tier.items())},
+        "routing_by_kind": by_kind,
+        "admission": admission,  # generative-tier outcomes: on_time / late / degraded / shed
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the tiered BFSI pipeline.")
+    parser.add_argument("--config", default=None, help="Path to settings.yaml (default: config/settings.yaml)")
+    parser.add_argument("--dataset", default=str(_PROJECT_ROOT / "data" / "alpaca_dataset.jsonl"))
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests (after warm-up)")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="Warm-up requests after the cold-start query, excluded from results")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--mix", default="dataset=0.6,paraphrase=0.2,ood=0.1,policy=0.1")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--stub", action="store_true", help="Use stub encoder and SLM (offline, fast)")
+    parser.add_argument("--stub-ms-per-token", type=float, default=0.0,
+                        help="Simulated decode cost per token for the stub SLM")
+    parser.add_argument("--deadline-ms", type=float, default=None,
+                        help="Per-request deadline passed to process() (default: admission.default_deadline_ms)")
+    parser.add_argument("--output", default=None, help="Write JSON results to this path")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    dataset_queries = load_dataset_queries(Path(args.dataset))
+    if not dataset_queries:
+        print(f"No queries found in {args.dataset}")
+        return 1
+    # workload[0]: cold-start query; then args.warmup warm-up requests; then args.requests measured
+    workload = build_workload(dataset_queries, mix, 1 + args.warmup + args.requests, args.seed)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bfsi-bench-")) if args.stub else None
+    orch = None
+    try:
+        # Cold start: construction plus the first query (models load lazily)
+        t0 = time.perf_counter()
+        orch = build_orchestrator(args.config, args.stub, args.stub_ms_per_token, work_dir)
+        init_s = time.perf_counter() - t0
+        rss_after_init = peak_rss_mb()
+        t1 = time.perf_counter()
+        first = orch.process(workload[0]["query"])
+        first_query_s = time.perf_counter() - t1
+
+        warm = run_workload(orch, workload[1:1 + args.warmup], 1) if args.warmup > 0 else None
+        measured = run_workload(orch, workload[1 + args.warmup:], args.concurrency, args.deadline_ms)
+        summary = summarize(measured["records"], measured["wall_s"])
+
+        result = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+            "params": {
+                "requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency,
+                "mix": mix, "seed": args.seed, "stub": args.stub, "stub_ms_per_token": args.stub_ms_per_token,
+                "deadline_ms": args.deadline_ms,
+            },
+            "cold_start": {
+                "init_s": init_s,
+                "first_query_s": first_query_s,
+                "first_query_tier": first.get("metadata", {}).get("tier") or first.get("source"),
+                "warmup_p50_ms": percentiles([r["latency_ms"] for r in warm["records"]]).get("p50_ms") if warm else None,
+            },
+            "warm": summary,
+            "memory": {"rss_after_init_mb": rss_after_init, "peak_rss_mb": peak_rss_mb()},
+        }
+
+        print(f"Cold start: init {init_s:.2f}s, first query {first_query_s:.2f}s")
+        print(f"Throughput: {summary['throughput_rps']:.2f} req/s over {summary['wall_s']:.2f}s "
+              f"({summary['requests']} requests, concurrency {args.concurrency}, {summary['errors']} errors)")
+        for tier, stats in summary["tiers"].items():
+            print(f"  {tier:<18} n={stats['count']:<5} p50={stats['p50_ms']:.1f}ms "
+                  f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+        for kind, tiers in sorted(summary["routing_by_kind"].items()):
+            print(f"  {kind:<18} -> " + ", ".join(f"{tier}={n}" for tier, n in sorted(tiers.items())))
+        if summary["admission"]:
+            print("Admission: " + ", ".join(f"{k}={v}" for k, v in sorted(summary["admission"].items())))
+        print(f"Peak RSS: {result['memory']['peak_rss_mb']:.1f} MB")
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+            print(f"Results written to {args.output}")
+    finally:
+        if work_dir is not None:
+            if orch is not None:
+                orch.audit.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+BFSI Call Center AI - Sharded Tier-1 Index Scaling Benchmark
+Measures Tier-1 nearest-neighbour search latency and throughput over a large
+embedding matrix, in-process and with 1..N shard worker processes, and checks
+that every sharded result (best row, score, match decision) equals the
+in-process one.
+
+By default a synthetic, row-normalized matrix is generated (--rows x --dim);
+--embeddings scores an existing <store>.emb-<encoder>.npy instead. Queries are a mix of
+perturbed copies of dataset rows (expected matches) and random vectors (misses).
+
+Usage:
+  python scripts/benchmark_shards.py --rows 2000000 --shards 1,2,4,8 --output shards.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+
+from benchmark_pipeline import git_commit, percentiles  # noqa: E402
+
+
+def write_synthetic(path: Path, rows: int, dim: int, seed: int, chunk: int = 65536) -> None:
+    """Random unit vectors, written in chunks so memory stays bounded."""
+    rng = np.random.default_rng(seed)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(rows, dim))
+    for start in range(0, rows, chunk):
+        block = rng.standard_normal((min(chunk, rows - start), dim), dtype=np.float32)
+        out[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    out.flush()
+    del out
+
+
+def build_queries(embeddings: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Half perturbed dataset rows (should match), half random unit vectors (should not)."""
+    rng = np.random.default_rng(seed + 1)
+    near = embeddings[np.sort(rng.choice(embeddings.shape[0], count // 2, replace=False))].astype(np.float32)
+    near += noise * rng.standard_normal(near.shape, dtype=np.float32)
+    far = rng.standard_normal((count - len(near), embeddings.shape[1]), dtype=np.float32)
+    queries = np.concatenate([near, far])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def run(search, queries: np.ndarray, concurrency: int) -> dict:
+    """Sequential per-query latency, then throughput at the given concurrency."""
+    search(queries[0])  # warm-up
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(search(q))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(search, queries))
+    wall_s = time.perf_counter() - start
+    return {
+        "latency": percentiles(latencies),
+        "throughput_qps": len(queries) / wall_s if wall_s > 0 else 0.0,
+        "best_rows": np.array([int(r[0][0]) for r in results]),
+        "best_scores": np.array([float(r[1][0]) for r in results]),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sharded Tier-1 search scaling.")
+    parser.add_argument("--embeddings", default=None, help="Existing row-normalized .npy matrix (default: synthetic)")
+    parser.add_argument("--rows", type=int, default=500000, help="Synthetic matrix rows")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic matrix dimension")
+    parser.add_argument("--shards", default=None, help="Shard counts to test, e.g. 1,2,4 (default: 1,2,4,.. up to cores)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="Client threads for the throughput run")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Tier-1 threshold for decision parity")
+    parser.add_argument("--noise", type=float, default=0.02, help="Perturbation of near-duplicate queries")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write JSON results to this path")
+    args = parser.parse_args(argv)
+
+    from src.sharded_index import ShardedIndex, top_k_rows
+
+    cores = os.cpu_count() or 1
+    if args.shards:
+        shard_counts = [int(s) for s in args.shards.split(",") if s.strip()]
+    else:
+        shard_counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= cores] or [1]
+
+    tmp_dir = None
+    if args.embeddings:
+        emb_path = Path(args.embeddings)
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        emb_path = Path(tmp_dir.name) / "synthetic.emb.npy"
+        start = time.perf_counter()
+        write_synthetic(emb_path, args.rows, args.dim, args.seed)
+        print(f"Generated {args.rows} x {args.dim} matrix in {time.perf_counter() - start:.1f}s")
+
+    try:
+        embeddings = np.load(emb_path)
+        queries = build_queries(embeddings, args.queries, args.noise, args.seed)
+        print(f"Matrix: {embeddings.shape[0]} x {embeddings.shape[1]} ({embeddings.nbytes / 2**20:.0f} MB), "
+              f"{len(queries)} queries, {cores} cores")
+
+        baseline = run(lambda q: top_k_rows(embeddings, q, 1), queries, args.concurrency)
+        baseline_match = baseline["best_scores"] >= args.threshold
+        results = {
+            "commit": git_commit(),
+            "host": {"python": platform.python_version(), "machine": platform.machine(), "cores": cores},
+            "params": {"rows": int(embeddings.shape[0]), "dim": int(embeddings.shape[1]), "queries": len(queries),
+                       "concurrency": args.concurrency, "threshold": args.threshold,
+                       "embeddings": str(args.embeddings) if args.embeddings else "synthetic"},
+            "in_process": {"latency": baseline["latency"], "throughput_qps": baseline["throughput_qps"],
+                           "matches": int(baseline_match.sum())},
+            "sharded": [],
+        }
+        del embeddings
+
+        print(f"  in-process   p50={baseline['latency']['p50_ms']:.2f}ms p95={baseline['latency']['p95_ms']:.2f}ms "
+              f"throughput={baseline['throughput_qps']:.1f} q/s")
+        parity_ok = True
+        for n in shard_counts:
+            start = time.perf_counter()
+            index = ShardedIndex(emb_path, n)
+            startup_s = time.perf_counter() - start
+            try:
+                r = run(lambda q: index.top_k(q, 1), queries, args.concurrency)
+            finally:
+                index.close()
+            match = r["best_scores"] >= args.threshold
+            identical = bool(np.array_equal(match, baseline_match)
+                             and np.array_equal(r["best_rows"][match], baseline["best_rows"][match]))
+            parity_ok &= identical
+            speedup = baseline["latency"]["p50_ms"] / r["latency"]["p50_ms"] if r["latency"]["p50_ms"] else 0.0
+            results["sharded"].append({
+                "shards": n, "startup_s": startup_s, "latency": r["latency"], "throughput_qps": r["throughput_qps"],
+                "p50_speedup": speedup, "decisions_identical": identical,
+                "max_score_delta": float(np.abs(r["best_scores"] - baseline["best_scores"]).max()),
+            })
+            print(f"  shards={n:<4} p50={r['latency']['p50_ms']:.2f}ms p95={r['latency']['p95_ms']:.2f}ms "
+                  f"throughput={r['throughput_qps']:.1f} q/s speedup(p50)={speedup:.2f}x "
+                  f"startup={startup_s:.1f}s {'OK' if identical else 'MISMATCH'}")
+        results["parity_ok"] = parity_ok
+        print("PARITY OK" if parity_ok else "PARITY FAILED: sharded Tier-1 decisions differ")
+    finally:
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0 if parity_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+BFSI Call Center AI - Streaming Dataset Ingest Pipeline
+Merges Alpaca sources (JSON / JSONL files, e.g. product-specific datasets, and
+the built-in samples of generate_dataset.py) into one JSONL dataset:
+  1. Sources are parsed and validated in parallel worker processes; each streams
+     its valid records to a temporary JSONL part.
+  2. Parts are merged in source order as they complete. Exact duplicates
+     (normalized instruction + input) are dropped, the rest are embedded in
+     batches and near-duplicates of an already accepted entry (found through
+     SimHash LSH buckets) are dropped.
+  3. Accepted records go to the output JSONL and, in the same pass, to the
+     compact response store and embedding matrix that DatasetSimilarityChecker
+     opens at startup (no full-file parse, no re-encoding).
+Only one batch of records is in memory at a time, plus a hash per accepted
+entry and fixed-size LSH tables; accepted embeddings are spilled to disk.
+
+Usage:
+  python scripts/build_dataset.py --builtin data/products/cards.jsonl data/products/loans.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+_SCRIPTS_DIR = Path(__file__).resolve().parent
+_PROJECT_ROOT = _SCRIPTS_DIR.parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+sys.path.insert(0, str(_SCRIPTS_DIR))
+
+BUILTIN_SOURCE = "builtin"
+
+# Reasons a source record is rejected
+INVALID_REASONS = ("not_object", "bad_type", "missing_field", "empty_output", "empty_query", "pii", "parse_error")
+
+
+def validate_record(item) -> Tuple[Optional[dict], Optional[str], Optional[str]]:
+    """
+    (clean record, None, None) for a valid Alpaca record, else (None, reason, detail).
+    For "pii" the detail names the field and identifier kind, e.g. "output:card".
+    """
+    from src.guardrails import find_pii
+    from src.response_store import FIELDS
+
+    if not isinstance(item, dict):
+        return None, "not_object", None
+    if "instruction" not in item or "output" not in item:
+        return None, "missing_field", None
+    record = {}
+    for field in FIELDS:
+        value = item.get(field)
+        if value is None:
+            value = ""
+        if not isinstance(value, str):
+            return None, "bad_type", field
+        record[field] = value.strip()
+    if not record["output"]:
+        return None, "empty_output", None
+    if not record["instruction"] and not record["input"]:
+        return None, "empty_query", None
+    # Dataset text is returned verbatim by Tier 1: it must never carry customer data.
+    # Only checksum-valid / issued-format identifiers count, so helpline numbers etc. pass.
+    for field, text in record.items():
+        found = find_pii(text)
+        if found is not None:
+            return None, "pii", f"{field}:{found[0]}"
+    return record, None, None
+
+
+def dedupe_key(record: dict) -> bytes:
+    """Exact-duplicate key: case- and whitespace-normalized instruction + input."""
+    text = " ".join(f"{record['instruction']} {record['input']}".lower().split())
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def _source_records(source: str, on_error) -> Iterator[dict]:
+    if source == BUILTIN_SOURCE:
+        from generate_dataset import DATASET
+        return iter(DATASET)
+    from src.response_store import iter_records
+    return iter_records(source, on_error)
+
+
+def ingest_source(source: str, part_path: str) -> dict:
+    """
+    Worker: stream one source, validate, write valid records to part_path (JSONL). Returns counts.
+    A malformed JSONL line is counted as parse_error (the first one kept in "error") and skipped;
+    a source that cannot be read to the end sets "failed".
+    """
+    counts = {"source": source, "read": 0, "valid": 0, **dict.fromkeys(INVALID_REASONS, 0), "pii_matches": {}}
+
+    def bad_line(line_no: int, e: ValueError) -> None:
+        counts["read"] += 1
+        counts["parse_error"] += 1
+        counts.setdefault("error", f"line {line_no}: {type(e).__name__}: {e}")
+
+    with open(part_path, "w", encoding="utf-8") as out:
+        try:
+            for item in _source_records(source, bad_line):
+                counts["read"] += 1
+                record, reason, detail = validate_record(item)
+                if record is None:
+                    counts[reason] += 1
+                    if reason == "pii":
+                        counts["pii_matches"][detail] = counts["pii_matches"].get(detail, 0) + 1
+                    continue
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                counts["valid"] += 1
+        except (OSError, ValueError) as e:
+            counts["failed"] = f"{type(e).__name__}: {e}"
+    return counts
+
+
+class NearDuplicateFilter:
+    """
+    Greedy near-duplicate filter in bounded memory: a row is kept unless it is within
+    threshold of an earlier kept row found through SimHash LSH.
+    Kept rows are appended to spill_path (raw float32) as they are accepted; the
+    LSH tables hold only row ids (bands x 2**bits buckets of bucket_size recent
+    rows), so memory does not grow with the dataset and each row is compared
+    with at most bands * bucket_size earlier rows. Candidates are scored exactly
+    (cosine) from the spill file, so a dropped row is always a true near-duplicate;
+    a near-duplicate that shares no bucket with its original is missed.
+    """
+
+    def __init__(self, threshold: float, spill_path: Path, bands: int = 16, bits: int = 16,
+                 bucket_size: int = 8, seed: int = 0):
+        self.threshold = threshold
+        self.spill_path = Path(spill_path)
+        self.bands, self.bits, self.bucket_size = bands, bits, bucket_size
+        self.seed = seed
+        self.count = 0
+        self.dim = 0
+        self._spill = open(self.spill_path, "w+b")
+        self._planes = None
+        self._table = None  # (bands, 2**bits, bucket_size) row ids, -1 = empty
+        self._fill = None   # rows ever inserted per bucket (ring-buffer position)
+
+    def _init_tables(self, dim: int) -> None:
+        self.dim = dim
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((dim, self.bands * self.bits)).astype(np.float32)
+        self._weights = (1 << np.arange(self.bits, dtype=np.int64))
+        if self.threshold > 0:
+            self._table = np.full((self.bands, 1 << self.bits, self.bucket_size), -1, dtype=np.int32)
+            self._fill = np.zeros((self.bands, 1 << self.bits), dtype=np.int64)
+
+    def _bucket_keys(self, emb: np.ndarray) -> np.ndarray:
+        """(rows, bands) bucket index per band from the signs of random projections."""
+        signs = (emb @ self._planes > 0).reshape(emb.shape[0], self.bands, self.bits)
+        return signs.astype(np.int64) @ self._weights
+
+    def _earlier_best(self, emb: np.ndarray, keys: np.ndarray, chunk_rows: int = 64) -> np.ndarray:
+        """Best cosine of each row against the earlier kept rows sharing one of its buckets."""
+        best = np.full(emb.shape[0], -np.inf, dtype=np.float32)
+        if not self.count:
+            return best
+        self._spill.flush()
+        kept = np.memmap(self.spill_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        # (rows, bands * bucket_size) candidate row ids
+        candidates = self._table[np.arange(self.bands), keys].reshape(emb.shape[0], -1)
+        for start in range(0, emb.shape[0], chunk_rows):
+            cand = candidates[start:start + chunk_rows]
+            valid = cand >= 0
+            if not valid.any():
+                continue
+            rows, inverse = np.unique(cand[valid], return_inverse=True)
+            pos = np.zeros(cand.shape, dtype=np.int64)
+            pos[valid] = inverse
+            scores = np.einsum("id,ikd->ik", emb[start:start + chunk_rows], np.asarray(kept[rows])[pos])
+            scores[~valid] = -np.inf
+            best[start:start + cand.shape[0]] = scores.max(axis=1)
+        del kept
+        return best
+
+    def filter(self, emb: np.ndarray) -> np.ndarray:
+        """Boolean keep-mask for a batch of row-normalized embeddings; kept rows are spilled and indexed."""
+        emb = np.ascontiguousarray(emb, dtype=np.float32)
+        keep = np.ones(emb.shape[0], dtype=bool)
+        if not emb.shape[0]:
+            return keep
+        if self._planes is None:
+            self._init_tables(emb.shape[1])
+        if self.threshold > 0:
+            keys = self._bucket_keys(emb)
+            keep = self._earlier_best(emb, keys) < self.threshold
+            within = emb @ emb.T
+            for i in range(1, emb.shape[0]):
+                if keep[i] and (within[i, :i][keep[:i]] >= self.threshold).any():
+                    keep[i] = False
+            band_index = np.arange(self.bands)
+            for row_id, row_keys in enumerate(keys[keep], start=self.count):
+                slots = self._fill[band_index, row_keys] % self.bucket_size
+                self._table[band_index, row_keys, slots] = row_id
+                self._fill[band_index, row_keys] += 1
+        self._spill.write(emb[keep].tobytes())
+        self.count += int(keep.sum())
+        return keep
+
+    def write_npy(self, path: Path, chunk_bytes: int = 1 << 24) -> None:
+        """Copy the spilled rows into a (count, dim) float32 .npy file."""
+        self._spill.flush()
+        self._spill.seek(0)
+        with open(path, "wb") as out:
+            header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                      "fortran_order": False, "shape": (self.count, self.dim)}
+            np.lib.format.write_array_header_1_0(out, header)
+            while True:
+                data = self._spill.read(chunk_bytes)
+                if not data:
+                    break
+                out.write(data)
+
+    def close(self) -> None:
+        self._spill.close()
+        self.spill_path.unlink(missing_ok=True)
+
+
+def merge_records(parts, encoder, near_dups: NearDuplicateFilter, batch_size: int, out, stats: dict) -> Iterator[dict]:
+    """
+    Merge validated parts (in order), drop duplicates, write accepted records to out
+    and yield them (the caller builds the response store from this stream).
+    """
+    from src.dataset_similarity import DatasetSimilarityChecker
+    from src.index_tools import normalize_rows
+
+    seen = set()
+
+    def flush(batch: List[dict]) -> Iterator[dict]:
+        texts = [DatasetSimilarityChecker.search_text(r["instruction"], r["input"]) for r in batch]
+        keep = near_dups.filter(normalize_rows(encoder.encode(texts)))
+        stats["near_duplicates"] += int((~keep).sum())
+        for record, kept in zip(batch, keep):
+            if kept:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                stats["written"] += 1
+                yield record
+
+    batch: List[dict] = []
+    for part in parts:
+        with open(part, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                key = dedupe_key(record)
+                if key in seen:
+                    stats["exact_duplicates"] += 1
+                    continue
+                seen.add(key)
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield from flush(batch)
+                    batch = []
+    if batch:
+        yield from flush(batch)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Merge, validate and dedupe Alpaca sources into a JSONL dataset.")
+    parser.add_argument("sources", nargs="*", help="Alpaca JSON / JSONL files, merged in this order")
+    parser.add_argument("--builtin", action="store_true", help="Include the built-in samples (first)")
+    parser.add_argument("--config", default=str(_PROJECT_ROOT / "config" / "settings.yaml"))
+    parser.add_argument("--output", default=None, help="Output JSONL (default: similarity.dataset_path)")
+    parser.add_argument("--embedding-model", default=None, help="Encoder spec (default: similarity.embedding_model)")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.97,
+                        help="Drop entries at or above this cosine to an earlier one (0 disables)")
+    parser.add_argument("--lsh-bands", type=int, default=16, help="Near-duplicate LSH bands (more = better recall)")
+    parser.add_argument("--lsh-bits", type=int, default=16, help="SimHash bits per band (2**bits buckets per band)")
+    parser.add_argument("--lsh-bucket-size", type=int, default=8, help="Most recent rows kept per LSH bucket")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Records encoded per batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel source readers")
+    parser.add_argument("--no-index", action="store_true", help="Only write the JSONL (no store / embeddings)")
+    parser.add_argument("--report", default=None, help="Write JSON counts to this path")
+    args = parser.parse_args(argv)
+
+    sources = ([BUILTIN_SOURCE] if args.builtin else []) + [str(Path(s).resolve()) for s in args.sources]
+    if not sources:
+        parser.error("no sources given (pass files and/or --builtin)")
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    sim_cfg = dict(cfg.get("similarity", {}))
+    out_rel = args.output or sim_cfg.get("dataset_path", "data/alpaca_dataset.jsonl")
+    output = Path(out_rel) if Path(out_rel).is_absolute() else _PROJECT_ROOT / out_rel
+    if output.suffix != ".jsonl":
+        parser.error(f"output must be a .jsonl file: {output}")
+    spec = args.embedding_model or sim_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+
+    from src.dataset_similarity import DatasetSimilarityChecker
+    from src.embeddings import get_encoder
+    from src.response_store import ResponseStore
+
+    encoder = get_encoder(spec)
+    stats = {"exact_duplicates": 0, "near_duplicates": 0, "written": 0}
+    checker = DatasetSimilarityChecker({**sim_cfg, "dataset_path": str(output)}, str(_PROJECT_ROOT))
+
+    start = time.perf_counter()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    checker.store_path.parent.mkdir(parents=True, exist_ok=True)
+    # Private staging names, so concurrent builds (or a hot reload) never touch each other's files:
+    # the JSONL next to the output, everything else in a directory next to the store
+    fd, tmp_output = tempfile.mkstemp(prefix=output.name + ".", suffix=".tmp", dir=output.parent)
+    os.close(fd)
+    tmp_output = Path(tmp_output)
+    work_dir = Path(tempfile.mkdtemp(prefix=checker.store_path.name + ".", suffix=".staging",
+                                     dir=checker.store_path.parent))
+    staging = work_dir / checker.store_path.name
+    tmp_emb = work_dir / "embeddings.npy"
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(sources)))) as pool:
+            parts = [str(work_dir / f"part-{i}.jsonl") for i in range(len(sources))]
+            near_dups = NearDuplicateFilter(args.near_dup_threshold, work_dir / "embeddings.f32",
+                                            args.lsh_bands, args.lsh_bits, args.lsh_bucket_size)
+            futures = [pool.submit(ingest_source, s, p) for s, p in zip(sources, parts)]
+
+            def ready_parts() -> Iterator[str]:
+                # Merge in source order; later sources keep parsing meanwhile
+                for future, part in zip(futures, parts):
+                    future.result()
+                    yield part
+
+            try:
+                with open(tmp_output, "w", encoding="utf-8") as out:
+                    records = merge_records(ready_parts(), encoder, near_dups, args.batch_size, out, stats)
+                    if args.no_index:
+                        for _ in records:
+                            pass
+                    else:
+                        ResponseStore.build(records, staging).close()
+                if not args.no_index:
+                    near_dups.write_npy(tmp_emb)
+            finally:
+                near_dups.close()
+            source_counts = [f.result() for f in futures]
+        failed = [c for c in source_counts if c.get("failed")]
+        if failed:
+            for c in failed:
+                print(f"  {c['source']}: could not be read ({c['failed']})", file=sys.stderr)
+            print(f"Build aborted; {output} left unchanged", file=sys.stderr)
+            return 1
+        tmp_output.replace(output)
+
+        if not args.no_index:
+            # The store/embeddings are keyed by the final file's signature, known only now
+            store_path = checker.store_path_for(output)
+            ResponseStore.move(staging, store_path, ResponseStore.source_signature(output))
+            encoder_spec = getattr(encoder, "embedding_spec", spec)
+            emb_path, meta_path = DatasetSimilarityChecker.embeddings_paths(store_path, encoder_spec)
+            tmp_emb.replace(emb_path)
+            DatasetSimilarityChecker.write_embeddings_meta(
+                meta_path, DatasetSimilarityChecker.embeddings_meta(encoder_spec, near_dups.count)
+            )
+    finally:
+        tmp_output.unlink(missing_ok=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"output": str(output), "encoder": spec, "elapsed_s": time.perf_counter() - start,
+              "sources": source_counts, **stats}
+    for c in source_counts:
+        invalid = {k: c[k] for k in INVALID_REASONS if c[k]}
+        print(f"  {c['source']}: read {c['read']}, valid {c['valid']}" + (f", rejected {invalid}" if invalid else "")
+              + (f", pii in {c['pii_matches']}" if c["pii_matches"] else "")
+              + (f" ({c['error']})" if c.get("error") else ""))
+    print(f"Wrote {stats['written']} entries to {output} "
+          f"({stats['exact_duplicates']} exact and {stats['near_duplicates']} near duplicates dropped) "
+          f"in {report['elapsed_s']:.1f}s")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+BFSI Call Center AI - Tier-1 / RAG Threshold Calibration and Index Quality Report
+Embeds a labeled evaluation set in batch, computes query x dataset similarities in
+chunks, and sweeps thresholds to report precision/recall and the resulting tier
+routing mix (with expected latency and cost). Also flags near-duplicate dataset
+entries and reports RAG context hit rates per similarity_threshold.
+
+Evaluation set (JSON or JSONL), one record per query:
+  {"query": "...", "expected_index": 12}      # should match dataset row 12
+  {"query": "...", "expected_input": "..."}   # should match the row with this input
+  {"query": "...", "expected_index": null}    # should NOT match (goes to Tier 2/3)
+Without --eval-set, a synthetic set is built from the dataset (verbatim inputs and
+paraphrases as positives; out-of-dataset and policy queries as negatives).
+
+Usage:
+  python scripts/calibrate_thresholds.py --output calibration.json
+  python scripts/calibrate_thresholds.py --embedding-model hash:384 --from-benchmark bench.json
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+
+from benchmark_pipeline import OUT_OF_DATASET_QUERIES, POLICY_QUERIES, paraphrase, parse_mix  # noqa: E402
+
+# Rough per-request defaults (ms / relative compute units); override from a benchmark run
+DEFAULT_TIER_LATENCY_MS = {"dataset": 25.0, "slm": 4000.0, "rag": 5000.0}
+DEFAULT_TIER_COST = {"dataset": 1.0, "slm": 100.0, "rag": 130.0}
+
+
+def parse_range(spec: str) -> np.ndarray:
+    """'0.6:0.95:0.01' -> inclusive threshold grid."""
+    start, stop, step = (float(x) for x in spec.split(":"))
+    return np.round(np.arange(start, stop + step / 2, step), 4)
+
+
+def load_eval_set(path: Optional[Path], dataset: List[dict], paraphrases: int, seed: int) -> List[dict]:
+    """Labeled queries as {"query", "expected"} with expected a dataset index or None."""
+    if path is None:
+        rng = random.Random(seed)
+        positives = [i for i, item in enumerate(dataset) if item.get("input")]
+        items = [{"query": dataset[i]["input"], "expected": i} for i in positives]
+        for _ in range(paraphrases):
+            i = rng.choice(positives)
+            items.append({"query": paraphrase(dataset[i]["input"], rng), "expected": i})
+        items += [{"query": q, "expected": None} for q in OUT_OF_DATASET_QUERIES + POLICY_QUERIES]
+        return items
+
+    from src.response_store import iter_records
+
+    by_input = {item.get("input"): i for i, item in enumerate(dataset) if item.get("input")}
+    items = []
+    for rec in iter_records(path):
+        if "expected_input" in rec:
+            expected = by_input.get(rec["expected_input"])
+            if expected is None:
+                raise ValueError(f"expected_input not in dataset: {rec['expected_input']!r}")
+        else:
+            expected = rec.get("expected_index")
+        items.append({"query": rec["query"], "expected": expected})
+    return items
+
+
+def sweep_tier1(
+    best_idx: np.ndarray,
+    best_score: np.ndarray,
+    expected: List[Optional[int]],
+    complex_mask: np.ndarray,
+    thresholds: np.ndarray,
+    tier_latency: Dict[str, float],
+    tier_cost: Dict[str, float],
+) -> List[dict]:
+    """Precision/recall and routing mix for each candidate Tier-1 threshold."""
+    has_label = np.array([e is not None for e in expected])
+    label = np.array([e if e is not None else -1 for e in expected])
+    correct_idx = best_idx == label
+    n = len(expected)
+    rows = []
+    for t in thresholds:
+        match = best_score >= t
+        tp = int((match & correct_idx).sum())
+        fp = int((match & ~correct_idx).sum())
+        fn = int((has_label & ~(match & correct_idx)).sum())
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        mix = {
+            "dataset": float(match.mean()) if n else 0.0,
+            "rag": float((~match & complex_mask).mean()) if n else 0.0,
+            "slm": float((~match & ~complex_mask).mean()) if n else 0.0,
+        }
+        rows.append({
+            "threshold": float(t),
+            "tp": tp, "fp": fp, "fn": fn,
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "routing_mix": mix,
+            "expected_latency_ms": sum(mix[k] * tier_latency[k] for k in mix),
+            "expected_cost": sum(mix[k] * tier_cost[k] for k in mix),
+        })
+    return rows
+
+
+def sweep_rag(query_emb: np.ndarray, chunk_emb: np.ndarray, thresholds: np.ndarray, max_chunks: int) -> List[dict]:
+    """Mean retrieved chunks and empty-context rate for each RAG similarity_threshold."""
+    scores = query_emb @ chunk_emb.T  # policy queries x chunks: small
+    top = -np.sort(-scores, axis=1)[:, :max_chunks]
+    rows = []
+    for t in thresholds:
+        retrieved = (top >= t).sum(axis=1)
+        rows.append({
+            "threshold": float(t),
+            "mean_chunks": float(retrieved.mean()) if len(retrieved) else 0.0,
+            "empty_context_rate": float((retrieved == 0).mean()) if len(retrieved) else 0.0,
+        })
+    return rows
+
+
+def tier_profile(spec: Optional[str], benchmark: Optional[str], default: Dict[str, float]) -> Dict[str, float]:
+    """Per-tier values from 'tier=value,...', a benchmark_pipeline.py JSON (p50), or defaults."""
+    values = dict(default)
+    if benchmark:
+        with open(benchmark, "r", encoding="utf-8") as f:
+            tiers = json.load(f).get("warm", {}).get("tiers", {})
+        values.update({k: v["p50_ms"] for k, v in tiers.items() if k in values and "p50_ms" in v})
+    if spec:
+        values.update(parse_mix(spec))
+    return values
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate Tier-1 and RAG similarity thresholds.")
+    parser.add_argument("--config", default=str(_PROJECT_ROOT / "config" / "settings.yaml"))
+    parser.add_argument("--eval-set", default=None, help="Labeled JSON/JSONL evaluation set")
+    parser.add_argument("--embedding-model", default=None, help="Override embedding_model (e.g. hash:384)")
+    parser.add_argument("--thresholds", default="0.60:0.95:0.01", help="Tier-1 sweep start:stop:step")
+    parser.add_argument("--rag-thresholds", default="0.40:0.85:0.05", help="RAG sweep start:stop:step")
+    parser.add_argument("--min-precision", type=float, default=0.98, help="Precision floor for the recommendation")
+    parser.add_argument("--dup-threshold", type=float, default=0.95, help="Near-duplicate cosine threshold")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Rows per similarity block")
+    parser.add_argument("--batch-size", type=int, default=64, help="Encoder batch size")
+    parser.add_argument("--paraphrases", type=int, default=200, help="Synthetic paraphrases (no --eval-set)")
+    parser.add_argument("--tier-latency-ms", default=None, help="e.g. dataset=20,slm=3500,rag=4200")
+    parser.add_argument("--tier-cost", default=None, help="Relative cost units, e.g. dataset=1,slm=100,rag=130")
+    parser.add_argument("--from-benchmark", default=None, help="benchmark_pipeline.py JSON for tier latencies")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write JSON report to this path")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    sim_cfg, rag_cfg = cfg.get("similarity", {}), cfg.get("rag", {})
+
+    from src.embeddings import get_encoder
+    from src.index_tools import chunked_best_matches, near_duplicate_pairs, normalize_rows
+    from src.orchestrator import RAG_TRIGGER_KEYWORDS
+    from src.rag_retrieval import RAGRetriever
+    from src.response_store import iter_records
+
+    ds_rel = sim_cfg.get("dataset_path", "data/alpaca_dataset.jsonl")
+    ds_path = Path(ds_rel) if Path(ds_rel).is_absolute() else _PROJECT_ROOT / ds_rel
+    dataset = [
+        {"instruction": item.get("instruction", ""), "input": item.get("input", "")}
+        for item in iter_records(ds_path)
+    ]
+    eval_items = load_eval_set(Path(args.eval_set) if args.eval_set else None, dataset, args.paraphrases, args.seed)
+
+    def encode(encoder, texts: List[str]) -> np.ndarray:
+        parts = [encoder.encode(texts[i:i + args.batch_size]) for i in range(0, len(texts), args.batch_size)]
+        return normalize_rows(np.concatenate(parts)) if parts else np.zeros((0, 1), dtype=np.float32)
+
+    encoder = get_encoder(args.embedding_model or sim_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2"))
+    index = encode(encoder, [f"{d['instruction']} {d['input']}".strip() or d["input"] or d["instruction"] for d in dataset])
+    queries = [item["query"] for item in eval_items]
+    query_emb = encode(encoder, queries)
+    best_idx, best_score = chunked_best_matches(query_emb, index, args.chunk_size)
+
+    complex_mask = np.array([any(kw in q.lower() for kw in RAG_TRIGGER_KEYWORDS) for q in queries])
+    tier_latency = tier_profile(args.tier_latency_ms, args.from_benchmark, DEFAULT_TIER_LATENCY_MS)
+    tier_cost = tier_profile(args.tier_cost, None, DEFAULT_TIER_COST)
+    tier1 = sweep_tier1(best_idx, best_score, [i["expected"] for i in eval_items], complex_mask,
+                        parse_range(args.thresholds), tier_latency, tier_cost)
+
+    eligible = [r for r in tier1 if r["precision"] >= args.min_precision]
+    recommended = max(eligible, key=lambda r: (r["recall"], -r["threshold"])) if eligible else None
+
+    # RAG: queries that would reach Tier 3 at the configured Tier-1 threshold
+    current = float(sim_cfg.get("threshold", 0.85))
+    rag_queries = [q for q, s, c in zip(queries, best_score, complex_mask) if c and s < current] or POLICY_QUERIES
+    rag_encoder = get_encoder(args.embedding_model or rag_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2"))
+    chunks = RAGRetriever(rag_cfg, str(_PROJECT_ROOT))._load_knowledge()
+    rag = []
+    if chunks:
+        chunk_emb = encode(rag_encoder, [c["title"] + " " + c["text"] for c in chunks])
+        rag = sweep_rag(encode(rag_encoder, rag_queries), chunk_emb, parse_range(args.rag_thresholds),
+                        int(rag_cfg.get("max_context_chunks", 4)))
+
+    duplicates = [
+        {"a": i, "b": j, "score": s, "a_input": dataset[i]["input"], "b_input": dataset[j]["input"]}
+        for i, j, s in near_duplicate_pairs(index, args.dup_threshold, args.chunk_size)
+    ]
+
+    print(f"Eval queries: {len(queries)} | Dataset rows: {len(dataset)} | Current threshold: {current}")
+    print(f"{'thr':>5} {'prec':>6} {'recall':>6} {'f1':>6} {'tier1':>6} {'slm':>6} {'rag':>6} {'E[ms]':>8} {'E[cost]':>8}")
+    for r in tier1:
+        m = r["routing_mix"]
+        print(f"{r['threshold']:>5.2f} {r['precision']:>6.3f} {r['recall']:>6.3f} {r['f1']:>6.3f} "
+              f"{m['dataset']:>6.2f} {m['slm']:>6.2f} {m['rag']:>6.2f} "
+              f"{r['expected_latency_ms']:>8.0f} {r['expected_cost']:>8.1f}")
+    if recommended:
+        print(f"Recommended Tier-1 threshold (precision >= {args.min_precision}): {recommended['threshold']:.2f}")
+    else:
+        print(f"No Tier-1 threshold reaches precision >= {args.min_precision}")
+    if rag:
+        print(f"RAG sweep over {len(rag_queries)} Tier-3 queries:")
+        for r in rag:
+            print(f"  thr={r['threshold']:.2f} mean_chunks={r['mean_chunks']:.2f} empty={r['empty_context_rate']:.2f}")
+    print(f"Near-duplicate dataset pairs (cosine >= {args.dup_threshold}): {len(duplicates)}")
+    for d in duplicates[:10]:
+        print(f"  [{d['a']}] {d['a_input']!r} ~ [{d['b']}] {d['b_input']!r} ({d['score']:.3f})")
+
+    if args.output:
+        report = {
+            "eval_queries": len(queries), "dataset_rows": len(dataset), "current_threshold": current,
+            "tier_latency_ms": tier_latency, "tier_cost": tier_cost,
+            "tier1_sweep": tier1,
+            "recommended_threshold": recommended["threshold"] if recommended else None,
+            "rag_sweep": rag, "near_duplicates": duplicates,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
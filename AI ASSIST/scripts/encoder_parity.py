@@ -0,0 +1,132 @@
+"""
+BFSI Call Center AI - Embedding Backend Parity Check and Encode Benchmark
+Compares a candidate encoder backend (e.g. ONNX Runtime / int8) with the reference
+PyTorch encoder on the Alpaca dataset: Tier-1 match decisions at the configured
+threshold must be identical. Also reports single-query and batch encode latency.
+
+Usage:
+  python scripts/encoder_parity.py --candidate onnx-int8:sentence-transformers/all-MiniLM-L6-v2
+Exit code is 1 if any Tier-1 decision differs.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import yaml
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_PROJECT_ROOT))
+
+from benchmark_pipeline import OUT_OF_DATASET_QUERIES, POLICY_QUERIES, paraphrase, percentiles  # noqa: E402
+
+
+def tier1_decisions(encoder, dataset_texts: List[str], queries: List[str], threshold: float) -> dict:
+    """Best index, best score and match decision per query, as DatasetSimilarityChecker.search computes them."""
+    from src.index_tools import normalize_rows
+
+    index = normalize_rows(encoder.encode(dataset_texts))
+    q = normalize_rows(encoder.encode(queries))
+    scores = q @ index.T
+    best_idx = scores.argmax(axis=1)
+    best_score = scores[np.arange(len(queries)), best_idx]
+    return {"index": best_idx, "score": best_score, "match": best_score >= threshold}
+
+
+def encode_latency(encoder, queries: List[str], repeats: int, batch_size: int) -> dict:
+    """Per-query (batch of 1) latency percentiles and batched throughput."""
+    encoder.encode(queries[:1])  # warm-up
+    single = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        encoder.encode([queries[i % len(queries)]])
+        single.append((time.perf_counter() - start) * 1000.0)
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        encoder.encode(queries[i:i + batch_size])
+    batch_s = time.perf_counter() - start
+    return {"single": percentiles(single), "batch_size": batch_size,
+            "batch_texts_per_s": len(queries) / batch_s if batch_s > 0 else 0.0}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check Tier-1 parity of an embedding backend.")
+    parser.add_argument("--config", default=str(_PROJECT_ROOT / "config" / "settings.yaml"))
+    parser.add_argument("--reference", default=None, help="Reference embedding_model (default: from config)")
+    parser.add_argument("--candidate", required=True, help="Candidate embedding_model, e.g. onnx-int8:<model>")
+    parser.add_argument("--threshold", type=float, default=None, help="Tier-1 threshold (default: from config)")
+    parser.add_argument("--paraphrases", type=int, default=200, help="Paraphrased queries to add")
+    parser.add_argument("--repeats", type=int, default=200, help="Single-query encodes for latency")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write JSON results to this path")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    sim_cfg = cfg.get("similarity", {})
+    reference = args.reference or sim_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+    threshold = args.threshold if args.threshold is not None else float(sim_cfg.get("threshold", 0.85))
+
+    from src.embeddings import load_encoder
+    from src.response_store import iter_records
+
+    ds_rel = sim_cfg.get("dataset_path", "data/alpaca_dataset.jsonl")
+    ds_path = Path(ds_rel) if Path(ds_rel).is_absolute() else _PROJECT_ROOT / ds_rel
+    dataset_texts, dataset_inputs = [], []
+    for item in iter_records(ds_path):
+        inst, inp = item.get("instruction", ""), item.get("input", "")
+        dataset_texts.append(f"{inst} {inp}".strip() or inp or inst)
+        if inp:
+            dataset_inputs.append(inp)
+
+    rng = random.Random(args.seed)
+    queries = dataset_inputs + [paraphrase(rng.choice(dataset_inputs), rng) for _ in range(args.paraphrases)]
+    queries += OUT_OF_DATASET_QUERIES + POLICY_QUERIES
+
+    results = {"reference": reference, "candidate": args.candidate, "threshold": threshold, "queries": len(queries)}
+    decisions = {}
+    for role, spec in (("reference", reference), ("candidate", args.candidate)):
+        start = time.perf_counter()
+        encoder = load_encoder(spec)
+        load_s = time.perf_counter() - start
+        decisions[role] = tier1_decisions(encoder, dataset_texts, queries, threshold)
+        results[f"{role}_latency"] = {"load_s": load_s, **encode_latency(encoder, queries, args.repeats, args.batch_size)}
+
+    ref, cand = decisions["reference"], decisions["candidate"]
+    # Same decision = both miss, or both hit the same dataset entry
+    same = (ref["match"] == cand["match"]) & (~ref["match"] | (ref["index"] == cand["index"]))
+    mismatches = [
+        {"query": queries[i], "reference_score": float(ref["score"][i]), "candidate_score": float(cand["score"][i]),
+         "reference_index": int(ref["index"][i]), "candidate_index": int(cand["index"][i])}
+        for i in np.flatnonzero(~same)
+    ]
+    results["tier1_hits"] = {"reference": int(ref["match"].sum()), "candidate": int(cand["match"].sum())}
+    results["max_score_delta"] = float(np.abs(ref["score"] - cand["score"]).max())
+    results["mismatches"] = mismatches
+
+    print(f"Reference: {reference}\nCandidate: {args.candidate}\nThreshold: {threshold} | Queries: {len(queries)}")
+    print(f"Tier-1 hits: reference={results['tier1_hits']['reference']} candidate={results['tier1_hits']['candidate']}"
+          f" | max |score delta| = {results['max_score_delta']:.4f}")
+    for role in ("reference", "candidate"):
+        lat = results[f"{role}_latency"]
+        print(f"  {role:<9} encode p50={lat['single']['p50_ms']:.2f}ms p95={lat['single']['p95_ms']:.2f}ms "
+              f"batch={lat['batch_texts_per_s']:.0f} texts/s (load {lat['load_s']:.1f}s)")
+    for m in mismatches[:10]:
+        print(f"  MISMATCH: {m['query']!r} ref={m['reference_score']:.3f}@{m['reference_index']} "
+              f"cand={m['candidate_score']:.3f}@{m['candidate_index']}")
+    print("PARITY OK" if not mismatches else f"PARITY FAILED: {len(mismatches)} decision(s) differ")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
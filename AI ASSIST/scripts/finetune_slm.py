@@ -5,7 +5,6 @@ Model weights saved to models/slm_weights for local inference.
 Requires: transformers, datasets, peft, accelerate
 """
 
-import json
 import os
 import sys
 from pathlib import Path
@@ -15,12 +14,9 @@ sys.path.insert(0, str(_PROJECT_ROOT))
 
 
 def load_alpaca_dataset(path: Path) -> list:
-    """Load Alpaca BFSI dataset."""
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if not isinstance(data, list):
-        data = [data]
-    return data
+    """Load Alpaca BFSI dataset (JSON or JSONL, streamed)."""
+    from src.response_store import iter_records
+    return list(iter_records(path))
 
 
 def format_for_training(alpaca_item: dict) -> str:
@@ -36,7 +32,7 @@ def format_for_training(alpaca_item: dict) -> str:
 
 
 def main():
-    dataset_path = _PROJECT_ROOT / "data" / "alpaca_dataset.json"
+    dataset_path = _PROJECT_ROOT / "data" / "alpaca_dataset.jsonl"
     output_dir = _PROJECT_ROOT / "models" / "slm_weights"
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -2,13 +2,13 @@
 BFSI Alpaca Dataset Generator
 Generates 150+ Alpaca-formatted conversation samples for BFSI call center.
 Format: Instruction, Input, Output - as per Alpaca specification.
+Writes data/alpaca_dataset.jsonl through the streaming ingest pipeline
+(scripts/build_dataset.py), which validates and dedupes the samples and builds
+the Tier-1 response store and embeddings. Extra sources can be merged in:
+  python scripts/generate_dataset.py data/products/cards.jsonl
 """
 
-import json
-import os
-
-# Ensure data directory exists
-os.makedirs("data", exist_ok=True)
+import sys
 
 # 150+ BFSI Alpaca samples covering:
 # - Loan eligibility and application status
@@ -186,13 +186,14 @@ DATASET = [
     {"instruction": "Respond to loan disbursement delay.", "input": "My loan disbursement is delayed. Why?", "output": "Disbursement can be delayed due to pending documentation, property verification, or compliance checks. We recommend checking your application status in the app and ensuring all documents are submitted. Our loan team can provide specific reasons. Would you like me to connect you with them?"},
 ]
 
-# Validate Alpaca format
-for i, item in enumerate(DATASET):
-    assert "instruction" in item and "input" in item and "output" in item, f"Item {i} missing Alpaca fields"
 
-# Write to file
-with open("data/alpaca_dataset.json", "w", encoding="utf-8") as f:
-    json.dump(DATASET, f, ensure_ascii=False, indent=2)
+def main(argv=None) -> int:
+    from build_dataset import main as build_dataset
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    print(f"Generating {len(DATASET)} built-in Alpaca-formatted BFSI samples.")
+    return build_dataset(["--builtin", *argv])
+
 
-print(f"Generated {len(DATASET)} Alpaca-formatted BFSI samples.")
-print("Saved to data/alpaca_dataset.json")
+if __name__ == "__main__":
+    sys.exit(main())
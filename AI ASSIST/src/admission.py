@@ -0,0 +1,131 @@
+"""
+BFSI Call Center AI - Admission Control for the Generative Tiers (Tier 2 / Tier 3)
+Bounds how many SLM generations run and wait at once, tracks per-request
+deadlines and sizes each generation's token budget to the time left.
+Tier 1 never passes through here, so cheap dataset answers are not queued
+behind generations. Requests that cannot be served in time are shed or
+degraded according to the configured overload policy.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+DEFAULT_HOLD_MESSAGE = (
+    "We are experiencing high demand right now. Please hold and try again in a few minutes, "
+    "or contact our customer care team through our official website or helpline."
+)
+
+# Overload policies: what a shed/degraded request gets instead of a generation
+OVERLOAD_POLICIES = ("rag_context", "hold_message")
+
+OUTCOMES = ("on_time", "late", "degraded", "shed")
+
+
+class AdmissionController:
+    """
+    Bounded admission for SLM generations.
+    At most max_concurrent_generations run at once and at most max_queue wait;
+    a request arriving to a full queue is shed immediately, a queued request whose
+    deadline no longer leaves room for min_new_tokens is degraded.
+    """
+
+    def __init__(self, config: dict):
+        self.enabled = bool(config.get("enabled", True))
+        self.max_concurrent = max(1, int(config.get("max_concurrent_generations", 4)))
+        self.max_queue = max(0, int(config.get("max_queue", 16)))
+        self.default_deadline_ms = float(config.get("default_deadline_ms", 0) or 0)  # 0 = no deadline
+        self.min_new_tokens = max(1, int(config.get("min_new_tokens", 32)))
+        self.overload_policy = config.get("overload_policy", "rag_context")
+        if self.overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload_policy: {self.overload_policy!r} (expected one of {OVERLOAD_POLICIES})")
+        self.hold_message = config.get("hold_message") or DEFAULT_HOLD_MESSAGE
+        self.summary_max_chars = int(config.get("summary_max_chars", 600))
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._counts = dict.fromkeys(OUTCOMES, 0)
+
+    def deadline(self, deadline_ms: Optional[float] = None) -> Optional[float]:
+        """Absolute (time.monotonic) deadline for a request; None when it has none."""
+        ms = self.default_deadline_ms if deadline_ms is None else float(deadline_ms)
+        if ms <= 0:
+            return None
+        return time.monotonic() + ms / 1000.0
+
+    @staticmethod
+    def time_left_ms(deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return (deadline - time.monotonic()) * 1000.0
+
+    def token_budget(self, deadline: Optional[float], max_new_tokens: int, ms_per_token: float) -> int:
+        """
+        New-token budget that fits the time left at the current decode speed.
+        Returns 0 when even min_new_tokens (or max_new_tokens, if smaller) no longer fits.
+        """
+        left = self.time_left_ms(deadline)
+        if left is None or ms_per_token <= 0:
+            return max_new_tokens
+        budget = min(max_new_tokens, int(left / ms_per_token))
+        return budget if budget >= min(self.min_new_tokens, max_new_tokens) else 0
+
+    @contextmanager
+    def admit(self, deadline: Optional[float], ms_per_token: float) -> Iterator[Optional[str]]:
+        """
+        Hold a generation slot for the body of the with-block.
+        Yields None when admitted, else "shed" (queue full) or "degraded" (no slot
+        before the deadline left room for min_new_tokens); the caller must then
+        skip generation.
+        """
+        if not self.enabled:
+            yield None
+            return
+        with self._cond:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    status = "shed"
+                else:
+                    # Stop waiting once too little time is left to generate anything useful
+                    give_up = None if deadline is None else deadline - self.min_new_tokens * ms_per_token / 1000.0
+                    self._waiting += 1
+                    try:
+                        while self._active >= self.max_concurrent:
+                            timeout = None if give_up is None else give_up - time.monotonic()
+                            if timeout is not None and timeout <= 0:
+                                break
+                            self._cond.wait(timeout)
+                    finally:
+                        self._waiting -= 1
+                    status = None if self._active < self.max_concurrent else "degraded"
+            else:
+                status = None
+            if status is None:
+                self._active += 1
+        if status is not None:
+            yield status
+            return
+        try:
+            yield None
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+    def record(self, outcome: str) -> None:
+        """Count a request outcome: on_time, late, degraded or shed."""
+        with self._cond:
+            self._counts[outcome] += 1
+
+    def finish_outcome(self, deadline: Optional[float]) -> str:
+        """Record a completed generation as on_time or late and return the outcome."""
+        left = self.time_left_ms(deadline)
+        outcome = "late" if left is not None and left < 0 else "on_time"
+        self.record(outcome)
+        return outcome
+
+    def stats(self) -> dict:
+        """Outcome counters plus current load (for export to metrics / benchmarks)."""
+        with self._cond:
+            return {**self._counts, "active": self._active, "waiting": self._waiting}
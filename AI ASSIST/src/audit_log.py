@@ -0,0 +1,179 @@
+"""
+BFSI Call Center AI - Compliance Audit Log
+Every processed query and its response is recorded as one JSON line.
+The request path only enqueues a plain dict; PII masking, serialization and
+file I/O happen on a background writer thread that appends in batches and
+rotates the file by size. The queue is bounded: when the writer falls behind,
+the configured backpressure policy decides what happens and drops are counted.
+"""
+
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from src.guardrails import mask_pii
+
+# What log() does when the queue is full
+BACKPRESSURE_POLICIES = ("drop_new", "drop_oldest", "block")
+
+# Free-text fields that are PII-masked before they are written
+MASKED_FIELDS = ("query", "response", "error")
+
+# Sources whose query text is never written, only a keyed hash of it: guardrail
+# rejections are usually triggered by credentials the masking patterns may not catch
+REDACTED_SOURCES = ("guardrail_reject",)
+
+_STOP = object()
+
+
+class AuditLogger:
+    """
+    Asynchronous, append-only JSONL audit log with size-based rotation.
+    log() never does I/O; the writer thread flushes up to batch_size events
+    per write, at least every flush_interval_s.
+    """
+
+    def __init__(self, config: dict, base_path: Optional[str] = None):
+        self.base_path = Path(base_path) if base_path else Path(__file__).parent.parent
+        self.enabled = bool(config.get("enabled", True))
+        log_rel = config.get("path", "logs/audit.jsonl")
+        self.path = Path(log_rel) if Path(log_rel).is_absolute() else self.base_path / log_rel
+        self.mask_pii = bool(config.get("mask_pii", True))
+        self.batch_size = max(1, int(config.get("batch_size", 256)))
+        self.flush_interval_s = float(config.get("flush_interval_s", 1.0))
+        self.max_bytes = int(config.get("max_bytes", 50 * 1024 * 1024))  # 0 = never rotate
+        self.backup_count = int(config.get("backup_count", 0))  # rotated files kept; 0 = keep all
+        self.backpressure = config.get("backpressure", "drop_new")
+        if self.backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure: {self.backpressure!r} (expected one of {BACKPRESSURE_POLICIES})")
+        self.block_timeout_s = float(config.get("block_timeout_ms", 50)) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(config.get("queue_size", 10000))))
+        self._counts = {"enqueued": 0, "written": 0, "dropped": 0, "write_errors": 0, "rotations": 0}
+        self._counts_lock = threading.Lock()
+        # Key for query_hash; a per-process random key when unset (hashes then only correlate within a run)
+        key = config.get("hash_key") or os.environ.get("BFSI_AUDIT_HASH_KEY")
+        self._hash_key = key.encode("utf-8") if key else os.urandom(32)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def log(self, event: dict) -> bool:
+        """
+        Queue an event for writing (hot path: no masking, serialization or I/O).
+        Returns False if the event was dropped because the queue was full.
+        """
+        if not self.enabled:
+            return False
+        self._ensure_running()
+        event.setdefault("ts", time.time())
+        dropped = 0
+        try:
+            if self.backpressure == "block":
+                self._queue.put(event, timeout=self.block_timeout_s)
+            elif self.backpressure == "drop_oldest":
+                while True:
+                    try:
+                        self._queue.put_nowait(event)
+                        break
+                    except queue.Full:
+                        try:
+                            self._queue.get_nowait()
+                            dropped += 1
+                        except queue.Empty:
+                            pass
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        if dropped:
+            self._count("dropped", dropped)
+        return True
+
+    def stats(self) -> dict:
+        """Counters (enqueued / written / dropped / write_errors / rotations) plus current queue depth."""
+        with self._counts_lock:
+            return {**self._counts, "queued": self._queue.qsize()}
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._counts_lock:
+            self._counts[key] += n
+
+    def _ensure_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(e is _STOP for e in batch):
+                stop = True
+                batch = [e for e in batch if e is not _STOP]
+            if batch:
+                self._write(batch)
+
+    def _format(self, event: dict) -> str:
+        record = {"ts": datetime.fromtimestamp(event["ts"], timezone.utc).isoformat(timespec="milliseconds")}
+        record.update((k, v) for k, v in event.items() if k != "ts")
+        if record.get("source") in REDACTED_SOURCES and isinstance(record.get("query"), str):
+            query = record.pop("query").encode("utf-8")
+            record["query_hash"] = hmac.new(self._hash_key, query, hashlib.sha256).hexdigest()
+        if self.mask_pii:
+            for field in MASKED_FIELDS:
+                if isinstance(record.get(field), str):
+                    record[field] = mask_pii(record[field])
+        return json.dumps(record, ensure_ascii=False, default=str)
+
+    def _write(self, batch: list) -> None:
+        """Append one batch with a single write, rotating first if it would exceed max_bytes."""
+        try:
+            data = ("\n".join(self._format(e) for e in batch) + "\n").encode("utf-8")
+            if self.max_bytes and self.path.exists() and self.path.stat().st_size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self._count("written", len(batch))
+        except (OSError, TypeError, ValueError):
+            self._count("write_errors", len(batch))
+
+    def _rotate(self) -> None:
+        """Rename the current file to <name>.<UTC timestamp> and prune beyond backup_count."""
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self.path.replace(self.path.with_name(f"{self.path.name}.{stamp}"))
+        self._count("rotations")
+        if self.backup_count > 0:
+            rotated = sorted(self.path.parent.glob(f"{self.path.name}.*"))
+            for old in rotated[:-self.backup_count]:
+                old.unlink(missing_ok=True)
@@ -0,0 +1,311 @@
+"""
+BFSI Call Center AI - Continuous Batching Scheduler (Tier 2 / Tier 3)
+Runs one decoding loop over the shared SLM. Requests join the running batch at
+token boundaries (after their own prefill) and leave as soon as they finish,
+so a long generation never holds short ones hostage and the CPU stays busy.
+Each caller gets a Future of generated token ids, or a stream of them.
+Requests are bound to the model version they were submitted with; a batch only
+holds one version, so after a hot swap new-version requests wait until the
+old-version batch has drained.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterator, List, Optional, Tuple
+
+_DONE = object()
+
+
+class GenerationRequest:
+    """One generation: prompt ids, sampling settings, and where results go."""
+
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        temperature: float,
+        stopping_criteria: Optional[Callable] = None,
+        stream: bool = False,
+        version=None,
+    ):
+        self.input_ids = list(input_ids)
+        self.version = version
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.stopping_criteria = stopping_criteria
+        self.generated: List[int] = []
+        self.future: Future = Future()
+        self.tokens: Optional[queue.Queue] = queue.Queue() if stream else None
+        # When the first / latest token was produced (the first one follows queueing and prefill)
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+
+    def emit(self, token_id: int) -> None:
+        self.last_token_at = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = self.last_token_at
+        self.generated.append(token_id)
+        if self.tokens is not None:
+            self.tokens.put(token_id)
+
+    def decode_time(self) -> Tuple[int, float]:
+        """(decode steps after the first token, seconds they took in the shared batch)."""
+        if len(self.generated) < 2:
+            return 0, 0.0
+        return len(self.generated) - 1, self.last_token_at - self.first_token_at
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(self.generated)
+        if self.tokens is not None:
+            self.tokens.put(_DONE)
+
+
+class GenerationScheduler:
+    """
+    Iteration-level (continuous) batching over a causal LM.
+    The running batch keeps a left-padded KV cache; a joining request is prefilled
+    alone and its cache is padded in, a finished request's row is dropped.
+    """
+
+    def __init__(self, slm, config: dict):
+        self.slm = slm
+        self.max_batch_size = int(config.get("max_batch_size", 8))
+        self.top_k = int(config.get("top_k", 50))
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def submit(
+        self,
+        input_ids: List[int],
+        max_new_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stopping_criteria: Optional[Callable] = None,
+        stream: bool = False,
+        version=None,
+    ) -> GenerationRequest:
+        """Queue a generation; it joins the running batch at the next token boundary."""
+        request = GenerationRequest(
+            input_ids,
+            int(max_new_tokens if max_new_tokens is not None else self.slm.max_new_tokens),
+            float(temperature if temperature is not None else self.slm.temperature),
+            stopping_criteria,
+            stream,
+            version or self.slm.current_version(),
+        )
+        self._ensure_running()
+        self._queue.put(request)
+        return request
+
+    def stream(self, request: GenerationRequest) -> Iterator[int]:
+        """Yield token ids of a request submitted with stream=True as they are produced."""
+        while True:
+            token = request.tokens.get()
+            if token is _DONE:
+                break
+            yield token
+        request.future.result()  # re-raise a generation error, if any
+
+    def shutdown(self) -> None:
+        """Stop the decoding loop after the current step; pending requests are failed."""
+        self._stopped = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._loop, name="slm-batch-scheduler", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        import torch
+
+        active: List[GenerationRequest] = []
+        deferred: List[GenerationRequest] = []  # other-version requests waiting for the batch to drain
+        state = None
+        while not self._stopped:
+            # Admit new requests; block only when there is nothing to decode
+            joining = []
+            while len(active) + len(joining) < self.max_batch_size:
+                members = active or joining
+                batch_version = members[0].version if members else None
+                if deferred and (batch_version is None or deferred[0].version is batch_version):
+                    request = deferred.pop(0)
+                else:
+                    try:
+                        request = self._queue.get(block=not members and not deferred)
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        break
+                    if not request.future.set_running_or_notify_cancel():
+                        continue
+                if batch_version is not None and request.version is not batch_version:
+                    deferred.append(request)
+                    continue
+                joining.append(request)
+            if self._stopped:
+                active += deferred
+                break
+
+            try:
+                version = (active or joining)[0].version if (active or joining) else None
+                if version is None:
+                    continue
+                model, eos = version.model, version.tokenizer.eos_token_id
+                with torch.no_grad():
+                    for request in joining:
+                        state = self._join(model, state, request)
+                        active.append(request)
+                        self._sample_and_emit(state, [request], [len(active) - 1])
+                    if not active:
+                        continue
+                    keep = [i for i, r in enumerate(active) if not self._finished(r, eos)]
+                    for i, r in enumerate(active):
+                        if i not in keep:
+                            r.finish()
+                    if len(keep) != len(active):
+                        active = [active[i] for i in keep]
+                        state = self._select(state, keep) if active else None
+                    if not active:
+                        continue
+                    state = self._step(model, state)
+                    self._sample_and_emit(state, active, list(range(len(active))))
+            except Exception as e:
+                for r in active + [r for r in joining if r not in active]:
+                    if not r.future.done():
+                        r.finish(e)
+                active, state = [], None
+
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+            if request is not None and not request.future.done():
+                request.finish(RuntimeError("Generation scheduler stopped"))
+        for r in active:
+            if not r.future.done():
+                r.finish(RuntimeError("Generation scheduler stopped"))
+
+    def _finished(self, request: GenerationRequest, eos: Optional[int]) -> bool:
+        if not request.generated:
+            return False
+        if eos is not None and request.generated[-1] == eos:
+            return True
+        if len(request.generated) >= request.max_new_tokens:
+            return True
+        if request.stopping_criteria is not None:
+            import torch
+            ids = torch.tensor([request.input_ids + request.generated])
+            return bool(request.stopping_criteria(ids, None).any())
+        return False
+
+    def _sample_and_emit(self, state: dict, requests: List[GenerationRequest], rows: List[int]) -> None:
+        """Sample the next token for the given batch rows from state["logits"] and feed it back."""
+        import torch
+
+        logits = state["logits"][rows].float()
+        for j, (request, row) in enumerate(zip(requests, rows)):
+            scores = logits[j]
+            if request.temperature > 0:
+                scores = scores / request.temperature
+                if 0 < self.top_k < scores.shape[-1]:
+                    kth = torch.topk(scores, self.top_k).values[-1]
+                    scores = scores.masked_fill(scores < kth, float("-inf"))
+                token = int(torch.multinomial(torch.softmax(scores, dim=-1), 1))
+            else:
+                token = int(scores.argmax())
+            request.emit(token)
+            state["next_tokens"][row] = token
+
+    @staticmethod
+    def _pad_left(tensor, length: int, dim: int):
+        """Left-pad tensor with zeros along dim to the given length."""
+        import torch
+
+        pad = length - tensor.shape[dim]
+        if pad <= 0:
+            return tensor
+        shape = list(tensor.shape)
+        shape[dim] = pad
+        return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+    def _join(self, model, state: Optional[dict], request: GenerationRequest) -> dict:
+        """Prefill one request alone, then merge its cache into the batch (left-padded)."""
+        import torch
+        from src.slm_inference import cache_to_legacy
+
+        ids = torch.tensor([request.input_ids], device=model.device)
+        out = model(input_ids=ids, attention_mask=torch.ones_like(ids), use_cache=True)
+        cache = cache_to_legacy(out.past_key_values)
+        new = {
+            "cache": [list(layer) for layer in cache],
+            "mask": torch.ones((1, ids.shape[1]), dtype=torch.long, device=model.device),
+            "positions": torch.tensor([ids.shape[1]], device=model.device),
+            "next_tokens": torch.zeros(1, dtype=torch.long, device=model.device),
+            "logits": out.logits[:, -1, :],
+        }
+        if state is None:
+            return new
+
+        length = max(state["mask"].shape[1], new["mask"].shape[1])
+        merged_cache = []
+        for (k0, v0), (k1, v1) in zip(state["cache"], new["cache"]):
+            merged_cache.append([
+                torch.cat([self._pad_left(k0, length, 2), self._pad_left(k1, length, 2)], dim=0),
+                torch.cat([self._pad_left(v0, length, 2), self._pad_left(v1, length, 2)], dim=0),
+            ])
+        return {
+            "cache": merged_cache,
+            "mask": torch.cat([self._pad_left(state["mask"], length, 1), self._pad_left(new["mask"], length, 1)]),
+            "positions": torch.cat([state["positions"], new["positions"]]),
+            "next_tokens": torch.cat([state["next_tokens"], new["next_tokens"]]),
+            "logits": torch.cat([state["logits"], new["logits"]]),
+        }
+
+    @staticmethod
+    def _select(state: dict, keep: List[int]) -> dict:
+        """Keep only the given batch rows, trimming padding columns no remaining row needs."""
+        import torch
+
+        index = torch.tensor(keep, device=state["mask"].device)
+        mask = state["mask"].index_select(0, index)
+        used = mask.any(dim=0).nonzero()
+        start = int(used[0]) if len(used) else mask.shape[1]
+        return {
+            "cache": [[k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:]]
+                      for k, v in state["cache"]],
+            "mask": mask[:, start:],
+            "positions": state["positions"].index_select(0, index),
+            "next_tokens": state["next_tokens"].index_select(0, index),
+            "logits": state["logits"].index_select(0, index),
+        }
+
+    @staticmethod
+    def _step(model, state: dict) -> dict:
+        """One decoding step for every active row."""
+        import torch
+        from src.slm_inference import cache_from_legacy, cache_to_legacy
+
+        mask = torch.cat([state["mask"], torch.ones_like(state["mask"][:, :1])], dim=1)
+        out = model(
+            input_ids=state["next_tokens"].unsqueeze(1),
+            attention_mask=mask,
+            position_ids=state["positions"].unsqueeze(1),
+            past_key_values=cache_from_legacy(tuple(tuple(layer) for layer in state["cache"])),
+            use_cache=True,
+        )
+        return {
+            "cache": [list(layer) for layer in cache_to_legacy(out.past_key_values)],
+            "mask": mask,
+            "positions": state["positions"] + 1,
+            "next_tokens": state["next_tokens"].clone(),
+            "logits": out.logits[:, -1, :],
+        }
@@ -2,15 +2,53 @@
 BFSI Call Center AI - Alpaca Dataset Similarity Check (Tier 1)
 If strong similarity match is found, return stored response DIRECTLY without modification.
 Uses embedding-based similarity for lightweight local execution.
+The index can be hot-swapped with reload() when the dataset is regenerated.
+Embeddings are cached on disk next to the response store; with shards > 1 the
+matrix is scored by worker processes (see src/sharded_index.py).
 """
 
+import hashlib
 import json
 import os
+import tempfile
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Optional, Tuple
 
 import numpy as np
 
+from src.embeddings import get_encoder
+from src.response_store import ResponseStore
+from src.sharded_index import ShardedIndex, top_k_rows
+
+# Texts encoded per batch when building the embedding matrix
+ENCODE_BATCH = 4096
+
+
+class DatasetIndex:
+    """
+    One loaded dataset version: response store, row-normalized embeddings and version tag.
+    With shards, embeddings is a read-only memory map and scoring runs in the shard workers.
+    """
+
+    def __init__(self, store: ResponseStore, embeddings: np.ndarray, tag: str, shards: Optional[ShardedIndex] = None):
+        self.store = store
+        self.embeddings = embeddings
+        self.tag = tag
+        self.shards = shards
+
+    def top_matches(self, query_emb: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (dataset rows, cosine scores), best first, for a normalized query embedding."""
+        if self.shards is not None:
+            return self.shards.top_k(query_emb, k)
+        return top_k_rows(self.embeddings, query_emb, k)
+
+    def close(self) -> None:
+        """Stop shard workers (the store is released when no request references it)."""
+        if self.shards is not None:
+            self.shards.close()
+
 
 class DatasetSimilarityChecker:
     """
@@ -21,100 +59,250 @@ class DatasetSimilarityChecker:
 
     def __init__(self, config: dict, base_path: Optional[str] = None):
         self.base_path = Path(base_path) if base_path else Path(__file__).parent.parent
-        ds_rel = config.get("dataset_path", "data/alpaca_dataset.json")
+        ds_rel = config.get("dataset_path", "data/alpaca_dataset.jsonl")
         self.dataset_path = Path(ds_rel) if Path(ds_rel).is_absolute() else self.base_path / ds_rel
+        store_rel = config.get("store_path", "data/index/alpaca_store")
+        self.store_path = Path(store_rel) if Path(store_rel).is_absolute() else self.base_path / store_rel
         self.threshold = float(config.get("threshold", 0.85))
         self.top_k = int(config.get("top_k", 3))
         self.embedding_model_name = config.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+        self.num_shards = int(config.get("shards", 0))  # 0 / 1 = score in-process
         self._model = None
-        self._embeddings = None
-        self._dataset = None
-
-    def _load_dataset(self) -> list:
-        """Load Alpaca-formatted dataset."""
-        if self._dataset is not None:
-            return self._dataset
-        path = self.dataset_path
-        if not path.exists():
-            raise FileNotFoundError(f"Dataset not found: {path}")
-        with open(path, "r", encoding="utf-8") as f:
-            self._dataset = json.load(f)
-        if not isinstance(self._dataset, list):
-            self._dataset = [self._dataset]
-        return self._dataset
+        self._index: Optional[DatasetIndex] = None
+        self._retired: Optional[DatasetIndex] = None  # previous version, kept until the next swap
+        self._index_lock = threading.Lock()
+
+    @staticmethod
+    def dataset_version_tag(dataset_path: Path) -> str:
+        """Version tag for a dataset file: file name plus a digest of its size and mtime."""
+        signature = ResponseStore.source_signature(dataset_path)
+        digest = hashlib.sha1(json.dumps(signature, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+        return f"{dataset_path.name}@{digest}"
+
+    def _versioned_store_path(self, tag: str) -> Path:
+        """Each dataset version gets its own store files, so a swap never rewrites files still mapped."""
+        return self.store_path.with_name(f"{self.store_path.name}-{tag.rsplit('@', 1)[-1]}")
+
+    def store_path_for(self, dataset_path: Path) -> Path:
+        """Store path used for a dataset file in its current version (lets ingest tools pre-build it)."""
+        return self._versioned_store_path(self.dataset_version_tag(Path(dataset_path)))
+
+    @staticmethod
+    def embeddings_paths(store_path: Path, encoder_spec: str) -> Tuple[Path, Path]:
+        """
+        (<store>.emb-<encoder digest>.npy, .json) for a store path. Each encoder has its own
+        files, so builds with different encoders (e.g. a hash:384 stub run) never share a cache.
+        """
+        base = f"{store_path.name}.emb-{hashlib.sha1(encoder_spec.encode('utf-8')).hexdigest()[:10]}"
+        return store_path.with_name(base + ".npy"), store_path.with_name(base + ".json")
+
+    @staticmethod
+    def embeddings_meta(encoder_spec: str, count: int) -> dict:
+        """Metadata that must match for cached embeddings to be reused."""
+        return {"encoder": encoder_spec, "count": count}
+
+    @staticmethod
+    def cached_embeddings_valid(emb_path: Path, meta_path: Path, meta: dict) -> bool:
+        """True if the cached matrix and its metadata both exist, the metadata equals meta and the row count agrees."""
+        try:
+            if json.loads(meta_path.read_text(encoding="utf-8")) != meta:
+                return False
+            return int(np.load(emb_path, mmap_mode="r").shape[0]) == meta["count"]
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def write_embeddings_meta(meta_path: Path, meta: dict) -> None:
+        """Write the metadata under a private temporary name, then rename it into place."""
+        fd, tmp = tempfile.mkstemp(prefix=meta_path.name + ".", suffix=".tmp", dir=meta_path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, meta_path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+    def _encoder_spec(self) -> str:
+        """Spec of the encoder in use (keys the embeddings cache)."""
+        return getattr(self._get_model(), "embedding_spec", self.embedding_model_name)
+
+    def _load_index(self, dataset_path: Path) -> DatasetIndex:
+        """
+        Open the compact, memory-mapped store for a dataset file and embed its queries.
+        The store is (re)built by streaming the source file when missing or stale.
+        """
+        if not dataset_path.exists():
+            raise FileNotFoundError(f"Dataset not found: {dataset_path}")
+        tag = self.dataset_version_tag(dataset_path)
+        store_path = self._versioned_store_path(tag)
+        store = ResponseStore.from_source(dataset_path, store_path)
+        emb_path = self._build_embeddings(store, store_path)
+        if self.num_shards > 1 and len(store):
+            return DatasetIndex(store, np.load(emb_path, mmap_mode="r"), tag, ShardedIndex(emb_path, self.num_shards))
+        return DatasetIndex(store, np.load(emb_path), tag)
 
     def _get_model(self):
-        """Lazy load sentence transformer model."""
+        """Lazy load the (shared) sentence embedding encoder; backend per embedding_model."""
         if self._model is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-                self._model = SentenceTransformer(self.embedding_model_name)
-            except ImportError:
-                raise ImportError(
-                    "sentence-transformers is required for similarity matching. "
-                    "Install with: pip install sentence-transformers"
-                )
+            self._model = get_encoder(self.embedding_model_name)
         return self._model
 
-    def _build_embeddings(self) -> np.ndarray:
-        """Build embeddings for all query representations in dataset."""
-        if self._embeddings is not None:
-            return self._embeddings
-        dataset = self._load_dataset()
-        # Use instruction + input as searchable text (represents user intent)
-        texts = []
-        for item in dataset:
-            inst = item.get("instruction", "")
-            inp = item.get("input", "")
-            text = f"{inst} {inp}".strip()
-            if not text:
-                text = inp or inst
-            texts.append(text)
+    @staticmethod
+    def search_text(instruction: str, inp: str) -> str:
+        """Searchable text of a dataset entry: instruction + input (represents user intent)."""
+        return f"{instruction} {inp}".strip() or inp or instruction
+
+    def _build_embeddings(self, dataset: ResponseStore, store_path: Path) -> Path:
+        """
+        Row-normalized float32 embeddings for all query representations in dataset,
+        saved as <store>.emb-<encoder digest>.npy and reused while its metadata and row count match.
+        Encoded in batches straight into the output file, so memory stays bounded.
+        """
         model = self._get_model()
-        self._embeddings = model.encode(texts)
-        return self._embeddings
+        spec = self._encoder_spec()
+        emb_path, meta_path = self.embeddings_paths(store_path, spec)
+        meta = self.embeddings_meta(spec, len(dataset))
+        if self.cached_embeddings_valid(emb_path, meta_path, meta):
+            return emb_path
+
+        # Private temporary name: concurrent builders (reload, other processes) never share it
+        fd, tmp = tempfile.mkstemp(prefix=emb_path.name + ".", suffix=".tmp.npy", dir=emb_path.parent)
+        os.close(fd)
+        tmp = Path(tmp)
+        try:
+            out = None
+            for start in range(0, max(len(dataset), 1), ENCODE_BATCH):
+                stop = min(start + ENCODE_BATCH, len(dataset))
+                texts = [self.search_text(dataset.get(i, "instruction"), dataset.get(i, "input"))
+                         for i in range(start, stop)]
+                emb = np.asarray(model.encode(texts), dtype=np.float32) if texts else np.zeros((0, 0), np.float32)
+                if out is None:
+                    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(dataset), emb.shape[-1]))
+                out[start:stop] = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-9)
+            out.flush()
+            del out
+            tmp.replace(emb_path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.write_embeddings_meta(meta_path, meta)
+        return emb_path
+
+    def snapshot(self) -> DatasetIndex:
+        """
+        The active index (loaded lazily). Callers that look up more than once per
+        request should take one snapshot and pass it on, so a concurrent reload()
+        cannot mix versions within the request.
+        """
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._load_index(self.dataset_path)
+                    # Versions left by restarts or offline rebuilds are never needed again
+                    self._remove_stale_stores({self._index.tag}, self._index.tag)
+        return self._index
 
-    def search(self, query: str) -> Tuple[Optional[str], float]:
+    @property
+    def version_tag(self) -> Optional[str]:
+        """Tag of the active dataset version, or None if not loaded yet."""
+        return self._index.tag if self._index is not None else None
+
+    def _load_dataset(self) -> ResponseStore:
+        """Response store of the active dataset version."""
+        return self.snapshot().store
+
+    def reload(self, dataset_path: Optional[str] = None) -> Future:
+        """
+        Build the store and embeddings for a (regenerated) dataset in the background,
+        then switch atomically. Searches already holding a snapshot finish on the old one.
+        Returns a Future resolving to the new version tag (or raising the load error;
+        the old version stays active on failure).
+        """
+        path = Path(dataset_path) if dataset_path else self.dataset_path
+        if not path.is_absolute():
+            path = self.base_path / path
+        result: Future = Future()
+
+        def _run() -> None:
+            try:
+                index = self._load_index(path)
+                with self._index_lock:
+                    previous, self._index = self._index, index
+                    retired, self._retired = self._retired, previous
+                    self.dataset_path = path
+                if retired is not None and retired is not index and retired is not previous:
+                    retired.close()
+                self._remove_stale_stores({index.tag, previous.tag if previous else index.tag}, index.tag)
+                result.set_result(index.tag)
+            except BaseException as e:
+                result.set_exception(e)
+
+        threading.Thread(target=_run, name="dataset-reload", daemon=True).start()
+        return result
+
+    def _remove_stale_stores(self, keep_tags: set, active_tag: str) -> None:
+        """
+        Delete store files of versions other than keep_tags (best effort). Only files
+        older than the active version's are removed, so a store another process is
+        building for a newer dataset is left alone.
+        """
+        keep = {self._versioned_store_path(tag).name for tag in keep_tags}
+        _, active_meta = self.embeddings_paths(self._versioned_store_path(active_tag), self._encoder_spec())
+        try:
+            cutoff = active_meta.stat().st_mtime_ns
+        except OSError:
+            return
+        for f in self.store_path.parent.glob(f"{self.store_path.name}-*"):
+            if f.name.split(".", 1)[0] in keep:
+                continue
+            try:
+                if f.is_file() and f.stat().st_mtime_ns < cutoff:
+                    f.unlink()
+            except OSError:
+                pass  # still mapped (e.g. on Windows); retried on the next load / reload
+
+    def close(self) -> None:
+        """Stop shard workers of the active and retired index versions."""
+        with self._index_lock:
+            indexes, self._index, self._retired = [self._index, self._retired], None, None
+        for index in indexes:
+            if index is not None:
+                index.close()
+
+    def _best_match(self, query: str, index: DatasetIndex) -> Tuple[int, float]:
+        """Best dataset row and its cosine score (global maximum, across all shards)."""
+        query_emb = np.asarray(self._get_model().encode([query]), dtype=np.float32).reshape(-1)
+        rows, scores = index.top_matches(query_emb / (np.linalg.norm(query_emb) + 1e-9), 1)
+        return int(rows[0]), float(scores[0])
+
+    def search(self, query: str, index: Optional[DatasetIndex] = None) -> Tuple[Optional[str], float]:
         """
         Search dataset for strong similarity match.
         Returns (output_text, similarity_score) or (None, 0.0) if no strong match.
         When match >= threshold, return the stored output EXACTLY without modification.
         """
-        dataset = self._load_dataset()
-        if not dataset:
+        index = index or self.snapshot()
+        if not len(index.store):
             return None, 0.0
 
-        embeddings = self._build_embeddings()
-        model = self._get_model()
-        query_emb = model.encode([query])
-        scores = np.dot(embeddings, query_emb.T).flatten() / (
-            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_emb) + 1e-9
-        )
-        top_indices = np.argsort(scores)[::-1][: self.top_k]
-
-        best_idx = top_indices[0]
-        best_score = float(scores[best_idx])
+        best_idx, best_score = self._best_match(query, index)
 
         if best_score >= self.threshold:
             # STRICT: Return stored response exactly, no modification
-            output = dataset[best_idx].get("output", "")
+            output = index.store.get(best_idx, "output")
             return output, best_score
         return None, best_score
 
     def get_best_match_info(self, query: str) -> Optional[dict]:
         """Return full best match info (for debugging/logging)."""
-        dataset = self._load_dataset()
-        embeddings = self._build_embeddings()
-        model = self._get_model()
-        query_emb = model.encode([query])
-        scores = np.dot(embeddings, query_emb.T).flatten() / (
-            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_emb) + 1e-9
-        )
-        best_idx = int(np.argmax(scores))
+        index = self.snapshot()
+        if not len(index.store):
+            return None
+        best_idx, best_score = self._best_match(query, index)
         return {
             "index": best_idx,
-            "score": float(scores[best_idx]),
-            "instruction": dataset[best_idx].get("instruction"),
-            "input": dataset[best_idx].get("input"),
-            "output": dataset[best_idx].get("output"),
+            "score": best_score,
+            "instruction": index.store.get(best_idx, "instruction"),
+            "input": index.store.get(best_idx, "input"),
+            "output": index.store.get(best_idx, "output"),
+            "dataset_version": index.tag,
         }
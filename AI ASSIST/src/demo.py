@@ -23,7 +23,7 @@ def main():
     except Exception as e:
         print(f"Initialization error: {e}")
         print("\nEnsure dependencies are installed: pip install -r requirements.txt")
-        print("Dataset must exist at data/alpaca_dataset.json")
+        print("Dataset must exist at data/alpaca_dataset.jsonl (python scripts/generate_dataset.py)")
         return 1
 
     # Demo queries covering all tiers
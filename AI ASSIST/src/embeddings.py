@@ -0,0 +1,194 @@
+"""
+BFSI Call Center AI - Sentence Embedding Encoders
+Shared, lazily loaded encoders for Tier 1 (dataset similarity) and Tier 3 (RAG).
+The backend is selected by a prefix on the configured embedding_model:
+  sentence-transformers/all-MiniLM-L6-v2            PyTorch eager (default)
+  onnx:sentence-transformers/all-MiniLM-L6-v2       ONNX Runtime, fp32
+  onnx-int8:sentence-transformers/all-MiniLM-L6-v2  ONNX Runtime, int8 dynamic quantized
+  hash:384                                          Hashed bag-of-words (offline stub)
+For onnx-int8 the model's published int8 export is used when it exists and suits
+this CPU; otherwise the fp32 ONNX export is quantized locally once (ONNX Runtime
+dynamic quantization) and cached under models/onnx-int8/.
+"""
+
+import hashlib
+import os
+import platform
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "hash")
+
+# Pre-quantized ONNX exports published alongside sentence-transformers models
+_INT8_ONNX_FILES = {
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "aarch64": "onnx/model_qint8_arm64.onnx",
+}
+_INT8_ONNX_DEFAULT = "onnx/model_quint8_avx2.onnx"
+
+# Locally quantized exports (models whose repos publish none, or CPUs without AVX2)
+_INT8_CACHE_DIR = Path(__file__).resolve().parent.parent / "models" / "onnx-int8"
+_INT8_LOCAL_FILE = "onnx/model_qint8_dynamic.onnx"
+
+_encoders: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def parse_model_spec(spec: str) -> Tuple[str, str]:
+    """Split an embedding_model setting into (backend, model name)."""
+    prefix, sep, rest = spec.partition(":")
+    if sep and prefix in BACKENDS:
+        return prefix, rest
+    return "torch", spec
+
+
+class HashEncoder:
+    """
+    Deterministic hashed bag-of-words encoder.
+    Stands in for a sentence-transformer so the pipeline runs offline without model downloads.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                token = token.strip("?.,!:;'\"()")
+                if not token:
+                    continue
+                h = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:4], "little")
+                out[row, h % self.dim] += 1.0
+        return out
+
+
+def load_encoder(spec: str):
+    """
+    Construct a new encoder for spec. Prefer get_encoder, which shares instances.
+    The encoder's embedding_spec attribute records spec (used to key cached embeddings).
+    """
+    encoder = _load_encoder(spec)
+    encoder.embedding_spec = spec
+    return encoder
+
+
+def _load_encoder(spec: str):
+    backend, name = parse_model_spec(spec)
+    if backend == "hash":
+        return HashEncoder(int(name) if name else 384)
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError(
+            "sentence-transformers is required for similarity matching. "
+            "Install with: pip install sentence-transformers"
+        )
+    if backend == "torch":
+        return SentenceTransformer(name)
+    try:
+        if backend == "onnx":
+            return SentenceTransformer(name, backend="onnx")
+        file_name = _prebuilt_int8_file(name)
+        if file_name is not None:
+            return SentenceTransformer(name, backend="onnx", model_kwargs={"file_name": file_name})
+        return SentenceTransformer(
+            str(_quantize_locally(name)), backend="onnx", model_kwargs={"file_name": _INT8_LOCAL_FILE}
+        )
+    except (ImportError, TypeError) as e:
+        raise ImportError(
+            f"The '{backend}' embedding backend needs sentence-transformers>=3.2 with ONNX Runtime. "
+            "Install with: pip install 'sentence-transformers[onnx]'"
+        ) from e
+
+
+def _cpu_has_avx2() -> bool:
+    """True if the CPU reports AVX2 (assumed when the flags cannot be read)."""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            return any(line.startswith("flags") and " avx2" in line for line in f)
+    except OSError:
+        return True
+
+
+def _model_has_file(name: str, file_name: str) -> bool:
+    """Whether a local model directory or Hub repo (or its local cache) contains file_name."""
+    if Path(name).is_dir():
+        return (Path(name) / file_name).is_file()
+    try:
+        from huggingface_hub import constants, file_exists, try_to_load_from_cache
+    except ImportError:
+        return False
+    if not constants.HF_HUB_OFFLINE:
+        try:
+            return bool(file_exists(name, file_name))
+        except Exception:
+            pass  # Hub unreachable: fall back to what is already cached
+    return isinstance(try_to_load_from_cache(name, file_name), str)
+
+
+def _prebuilt_int8_file(name: str) -> Optional[str]:
+    """The model's published int8 ONNX export for this CPU, or None if it has none."""
+    machine = platform.machine().lower()
+    file_name = _INT8_ONNX_FILES.get(machine)
+    if file_name is None:
+        if machine not in ("x86_64", "amd64") or not _cpu_has_avx2():
+            return None
+        file_name = _INT8_ONNX_DEFAULT
+    return file_name if _model_has_file(name, file_name) else None
+
+
+def _quantize_locally(name: str) -> Path:
+    """
+    Directory of a sentence-transformers model whose fp32 ONNX export was quantized to
+    int8 (dynamic, per-tensor weights) with ONNX Runtime; built once and reused.
+    """
+    target = _INT8_CACHE_DIR / name.strip("/").replace("/", "__").replace(":", "_")
+    if (target / _INT8_LOCAL_FILE).is_file():
+        return target
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError(
+            f"{name!r} publishes no int8 ONNX export for this CPU and local quantization needs "
+            "onnxruntime. Install with: pip install 'sentence-transformers[onnx]', or use the 'onnx:' backend."
+        ) from e
+    from sentence_transformers import SentenceTransformer
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=target.name + ".", suffix=".tmp", dir=target.parent))
+    try:
+        SentenceTransformer(name, backend="onnx").save(str(tmp))
+        fp32 = tmp / "onnx" / "model.onnx"
+        if not fp32.is_file():
+            raise RuntimeError(f"ONNX export of {name!r} not found at {fp32}")
+        quantize_dynamic(str(fp32), str(tmp / _INT8_LOCAL_FILE), weight_type=QuantType.QInt8)
+        fp32.unlink()
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            if not (target / _INT8_LOCAL_FILE).is_file():  # not just a concurrent build that won
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def get_encoder(spec: str):
+    """
+    Return the shared encoder for spec, loading it on first use.
+    Tier 1 and Tier 3 configured with the same model share one instance.
+    """
+    encoder = _encoders.get(spec)
+    if encoder is None:
+        with _lock:
+            encoder = _encoders.get(spec)
+            if encoder is None:
+                encoder = load_encoder(spec)
+                _encoders[spec] = encoder
+    return encoder
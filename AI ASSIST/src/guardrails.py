@@ -9,7 +9,132 @@ Absolute enforcement of safety and compliance rules.
 """
 
 import re
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Set, Tuple
+
+# Any number in grounding text (context, dataset, query) counts as verified
+_ANY_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+# Financial figures in generated text: currency amounts, percentages / rates,
+# amounts with Indian or basis-point units, decimals shortly after a rate / amount
+# word ("interest of 9.5", not "section 4.2") and digit-grouped amounts
+_FINANCIAL_NUMBER = re.compile(
+    r"(?:(?:rs\.?|inr|\u20b9|\$)\s*\d[\d,]*(?:\.\d+)?)"
+    r"|(?:\d[\d,]*(?:\.\d+)?\s*(?:%|percent\b|per\s+cent\b|bps\b|basis\s+points?\b"
+    r"|lakhs?\b|lacs?\b|crores?\b|rupees\b|p\.a\.))"
+    r"|(?:\b(?:rates?|interest|roi|apr|emi|amount|fees?|charges?|penalty|balance|limit|premium)\b"
+    r"[^\d.\n]{0,16}\d+\.\d+)"
+    r"|(?:\d{1,3}(?:,\d{2,3})+)",
+    re.IGNORECASE,
+)
+
+# Optional "is" / ":" / "no." between a credential keyword and its value
+_SECRET_SEP = r"(?:\s*(?:is|was|=|:|-|#|no\.?|number))*\s*"
+
+# 13-19 digits, optionally separated by spaces or dashes in any grouping (4-4-4-4, Amex 4-6-5, ...)
+_CARD_NUMBER = re.compile(r"\b(?:\d[ -]?){12,18}\d\b")
+_EMAIL = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b")
+_CVV = re.compile(r"\b(cvv2?|cvc2?|card verification (?:value|code))\b" + _SECRET_SEP + r"\d{3,4}\b", re.IGNORECASE)
+_OTP = re.compile(r"\b(otp|one[\s-]time[\s-]password)\b" + _SECRET_SEP + r"\d{4,8}\b", re.IGNORECASE)
+_PIN = re.compile(r"\b((?:atm |upi |debit card |card )?m?pin)\b" + _SECRET_SEP + r"\d{4,6}\b", re.IGNORECASE)
+_PASSWORD = re.compile(r"\b(password|passwd|pwd|passcode|passphrase)\b" + _SECRET_SEP + r"[^\s,;]+", re.IGNORECASE)
+
+# PII masking for logs, compiled once; applied in order.
+# Credentials keep their keyword so the log still shows what was shared.
+_PII_PATTERNS = (
+    (_CARD_NUMBER, "[CARD_MASKED]"),
+    (re.compile(r"\b\d{10,16}\b"), "[CARD_MASKED]"),
+    (re.compile(r"\b\d{4}[\s-]\d{4}[\s-]\d{4}\b"), "[AADHAAR_MASKED]"),
+    (re.compile(r"\b[A-Z]{5}\d{4}[A-Z]\b", re.IGNORECASE), "[PAN_MASKED]"),
+    (_EMAIL, "[EMAIL_MASKED]"),
+    (_CVV, r"\1 [CVV_MASKED]"),
+    (_OTP, r"\1 [OTP_MASKED]"),
+    (_PIN, r"\1 [PIN_MASKED]"),
+    (_PASSWORD, r"\1 [PASSWORD_MASKED]"),
+)
+
+# Verhoeff checksum tables (Aadhaar check digit)
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+DEFAULT_OUTPUT_FALLBACK = (
+    "I am unable to confirm the exact figures for this request. "
+    "Please refer to your loan agreement, our official website, or contact "
+    "our customer care team for verified rates, charges and amounts."
+)
+
+
+def _canonical_number(text: str) -> str:
+    """Normalize a numeric match to a comparable form ('1,00,000.00' -> '100000')."""
+    digits = re.sub(r"[^\d.]", "", text).rstrip(".")
+    if "." in digits:
+        digits = digits.rstrip("0").rstrip(".")
+    return digits.lstrip("0") or "0"
+
+
+def mask_pii(text: str) -> str:
+    """Mask card/account numbers, Aadhaar, PAN, e-mail addresses, CVVs, OTPs, PINs and passwords in text."""
+    if not text:
+        return ""
+    for pattern, replacement in _PII_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _luhn_valid(number: str) -> bool:
+    """Luhn checksum (payment card numbers); separators are ignored."""
+    digits = [int(c) for c in number if c.isdigit()]
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        if i % 2:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return total % 10 == 0
+
+
+def _verhoeff_valid(number: str) -> bool:
+    """Verhoeff checksum (Aadhaar numbers); separators are ignored."""
+    check = 0
+    for i, c in enumerate(reversed([c for c in number if c.isdigit()])):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(c)]]
+    return check == 0
+
+
+# Identifiers that are customer data wherever they appear, with their check (None = format only);
+# stricter than _PII_PATTERNS so reference text such as helpline numbers or "reset your
+# password" is not flagged
+_PII_IDENTIFIERS = (
+    ("card", _CARD_NUMBER, _luhn_valid),
+    ("aadhaar", re.compile(r"\b[2-9]\d{3}[ -]?\d{4}[ -]?\d{4}\b"), _verhoeff_valid),
+    ("pan", re.compile(r"\b[A-Z]{3}[ABCFGHJLPT][A-Z]\d{4}[A-Z]\b", re.IGNORECASE), None),
+    ("email", _EMAIL, None),
+    ("cvv", _CVV, None),
+    ("otp", _OTP, None),
+    ("pin", _PIN, None),
+)
+
+
+def find_pii(text: str) -> Optional[Tuple[str, str]]:
+    """
+    First customer identifier in text as (kind, matched text), or None.
+    Card and Aadhaar numbers must pass their checksum, PAN must match the
+    issued format; used where a false positive drops data (e.g. dataset ingest).
+    """
+    if not text:
+        return None
+    for kind, pattern, check in _PII_IDENTIFIERS:
+        for m in pattern.finditer(text):
+            if check is None or check(m.group(0)):
+                return kind, m.group(0)
+    return None
 
 
 class Guardrails:
@@ -54,10 +179,43 @@ class Guardrails:
 
     def sanitize_for_logging(self, text: str) -> str:
         """Remove or mask potentially sensitive content for logging."""
-        if not text:
-            return ""
-        # Mask patterns that might contain sensitive data
-        text = re.sub(r"\b\d{10,16}\b", "[CARD_MASKED]", text)
-        text = re.sub(r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b", "[CARD_MASKED]", text)
-        text = re.sub(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b", "[EMAIL_MASKED]", text)
-        return text
+        return mask_pii(text)
+
+
+class OutputValidator:
+    """
+    Output-side enforcement of "NO guessing of financial numbers".
+    Flags rates, amounts or percentages in generated text that do not appear
+    in the grounding for the current query (its RAG context or the query itself).
+    Used by SLMInference as a streaming stopping criterion so a bad generation
+    is aborted as soon as the offending number is complete.
+    """
+
+    def __init__(self, config: dict):
+        self.enabled = bool(config.get("validate_output", True))
+        self.fallback_response = config.get("output_fallback") or DEFAULT_OUTPUT_FALLBACK
+
+    @staticmethod
+    def allowed_numbers(texts: Iterable[str]) -> Set[str]:
+        """Canonical set of every number that appears in the grounding texts."""
+        allowed = set()
+        for text in texts:
+            if text:
+                allowed.update(_canonical_number(m) for m in _ANY_NUMBER.findall(text))
+        return allowed
+
+    def find_violation(self, text: str, allowed: Set[str], final: bool = True) -> Optional[str]:
+        """
+        Return the first ungrounded financial figure in text, or None.
+        With final=False (streaming), a match touching the end of text is ignored
+        because the number may still be incomplete.
+        """
+        if not self.enabled or not text:
+            return None
+        for m in _FINANCIAL_NUMBER.finditer(text):
+            if not final and m.end() >= len(text):
+                continue
+            numbers = _ANY_NUMBER.findall(m.group(0))
+            if any(_canonical_number(n) not in allowed for n in numbers):
+                return m.group(0).strip()
+        return None
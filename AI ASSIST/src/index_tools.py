@@ -0,0 +1,62 @@
+"""
+BFSI Call Center AI - Vectorized Index Utilities
+Chunked cosine-similarity helpers shared by offline tooling (threshold
+calibration, near-duplicate detection). Memory is bounded by the chunk size,
+never by the full query x dataset matrix.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+def normalize_rows(emb: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32 so dot products are cosine similarities."""
+    emb = np.asarray(emb, dtype=np.float32)
+    if emb.ndim == 1:
+        emb = emb.reshape(1, -1)
+    return emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-9)
+
+
+def chunked_best_matches(
+    queries: np.ndarray, index: np.ndarray, chunk_size: int = 4096
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best-matching index row and its cosine score for every query.
+    Both inputs must be row-normalized. The similarity matrix is computed in
+    (chunk_size x chunk_size) blocks.
+    """
+    n = queries.shape[0]
+    best_score = np.full(n, -np.inf, dtype=np.float32)
+    best_idx = np.zeros(n, dtype=np.int64)
+    for qs in range(0, n, chunk_size):
+        q = queries[qs:qs + chunk_size]
+        for ds in range(0, index.shape[0], chunk_size):
+            block = q @ index[ds:ds + chunk_size].T
+            arg = block.argmax(axis=1)
+            score = block[np.arange(block.shape[0]), arg]
+            better = score > best_score[qs:qs + chunk_size]
+            best_score[qs:qs + chunk_size][better] = score[better]
+            best_idx[qs:qs + chunk_size][better] = arg[better] + ds
+    return best_idx, best_score
+
+
+def near_duplicate_pairs(
+    index: np.ndarray, threshold: float, chunk_size: int = 4096
+) -> List[Tuple[int, int, float]]:
+    """
+    All (i, j, score) with i < j and cosine(index[i], index[j]) >= threshold.
+    index must be row-normalized; only the upper triangle of each block is kept.
+    """
+    pairs = []
+    n = index.shape[0]
+    for rs in range(0, n, chunk_size):
+        rows = index[rs:rs + chunk_size]
+        for cs in range(rs, n, chunk_size):
+            block = rows @ index[cs:cs + chunk_size].T
+            ii, jj = np.nonzero(block >= threshold)
+            for i, j in zip(ii.tolist(), jj.tolist()):
+                gi, gj = rs + i, cs + j
+                if gi < gj:
+                    pairs.append((gi, gj, float(block[i, j])))
+    return pairs
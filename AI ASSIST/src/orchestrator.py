@@ -7,6 +7,8 @@ Implements STRICT priority order (MUST NOT BE VIOLATED):
 """
 
 import sys
+import time
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Optional
 
@@ -27,6 +29,18 @@ RAG_TRIGGER_KEYWORDS = [
     "fixed vs floating", "repo rate", "lvt", "tax deduction",
 ]
 
+# RAG prompt template pieces; static text is tokenized once and cached by the SLM
+RAG_PROMPT_PREAMBLE = "The following is verified policy/knowledge. Use it to answer. Do NOT invent numbers.\n\n"
+RAG_CONTEXT_SEPARATOR = "\n\n"
+RAG_PROMPT_QUERY = "\n\n---\n\nUser query:"
+RAG_PROMPT_INSTRUCTION = (
+    "\n\nProvide a factual, policy-aligned response based on the above. "
+    "If the answer is not in the context, say so and direct to official channels."
+)
+
+# Lead-in for the verified policy excerpt returned instead of a generation under overload
+OVERLOAD_CONTEXT_PREFIX = "Here is the relevant policy information from our knowledge base:\n\n"
+
 
 class BFSIOrchestrator:
     """
@@ -42,47 +56,194 @@ class BFSIOrchestrator:
         self.base_path = base
 
         # Initialize components
-        from src.guardrails import Guardrails
+        from src.guardrails import Guardrails, OutputValidator
         from src.dataset_similarity import DatasetSimilarityChecker
         from src.slm_inference import SLMInference
         from src.rag_retrieval import RAGRetriever
+        from src.sessions import SessionManager
+        from src.admission import AdmissionController
+        from src.audit_log import AuditLogger
 
         self.guardrails = Guardrails(cfg.get("guardrails", {}))
+        self.output_validator = OutputValidator(cfg.get("guardrails", {}))
         self.dataset = DatasetSimilarityChecker(cfg.get("similarity", {}), str(base))
         self.slm = SLMInference(cfg.get("slm", {}), str(base))
         self.rag = RAGRetriever(cfg.get("rag", {}), str(base))
+        self.sessions = SessionManager(cfg.get("sessions", {}), self.slm, str(base))
+        self.admission = AdmissionController(cfg.get("admission", {}))
+        self.audit = AuditLogger(cfg.get("audit", {}), str(base))
+        # Knowledge chunks are tokenized when an SLM version loads, never per request
+        self.slm.add_version_hook(lambda tag: self.rag.tokenize_chunks(self.slm.encode_continuation, tag))
+
+    def reload_slm(self, weights_path: Optional[str] = None) -> Future:
+        """Hot-swap the SLM weights (e.g. new finetune_slm.py output); see SLMInference.reload."""
+        return self.slm.reload(weights_path)
+
+    def reload_dataset(self, dataset_path: Optional[str] = None) -> Future:
+        """Hot-swap the Tier-1 dataset index; see DatasetSimilarityChecker.reload."""
+        return self.dataset.reload(dataset_path)
+
+    def stats(self) -> dict:
+        """Operational counters: admission outcomes (on_time / late / degraded / shed) and load."""
+        return {
+            "admission": self.admission.stats(),
+            "audit": self.audit.stats(),
+            "slm_ms_per_token": self.slm.ms_per_token,
+        }
+
+    def _grounded_numbers(self, context: str = "") -> set:
+        """
+        Numbers a generation may state: those in the RAG context retrieved for this query
+        (the query's own numbers are added by SLMInference). Numbers from unrelated dataset
+        answers are deliberately not grounding.
+        """
+        return self.output_validator.allowed_numbers([context])
 
     def _is_complex_query(self, query: str) -> bool:
         """Determine if query requires RAG (complex financial/policy)."""
         q = query.lower()
         return any(kw in q for kw in RAG_TRIGGER_KEYWORDS)
 
-    def _generate_rag_response(self, query: str) -> str:
+    def _slm_generate(
+        self,
+        prompt: str,
+        query: str,
+        allowed_numbers: set,
+        session_id: Optional[str] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> str:
+        """Generate with the SLM, continuing the session's cached transcript when session_id is given."""
+        if session_id is None:
+            return self.slm.generate(
+                prompt, validator=self.output_validator, allowed_numbers=allowed_numbers,
+                max_new_tokens=max_new_tokens,
+            )
+        return self.sessions.generate(
+            session_id, prompt, query=query,
+            validator=self.output_validator, allowed_numbers=allowed_numbers, max_new_tokens=max_new_tokens,
+        )
+
+    def _generate_rag_response(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> str:
         """Retrieve context and generate RAG-grounded response."""
-        context = self.rag.get_context(query)
+        tokenized = None
+        if session_id is None:
+            # Token-level assembly: cached template ids + pre-tokenized chunks + the query
+            slm = self.slm
+            tag = slm.current_version().tag
+            tokenized = self.rag.get_context_ids(query, slm.segment_ids(RAG_CONTEXT_SEPARATOR), key=tag)
+        if tokenized is not None:
+            segments, context = tokenized
+            if context:
+                prompt_ids = slm.build_prompt_ids([
+                    slm.segment_ids(RAG_PROMPT_PREAMBLE),
+                    *segments,
+                    slm.segment_ids(RAG_PROMPT_QUERY),
+                    slm.encode_continuation(" " + query),
+                    slm.segment_ids(RAG_PROMPT_INSTRUCTION),
+                ])
+                return slm.generate_ids(
+                    prompt_ids, query,
+                    validator=self.output_validator,
+                    allowed_numbers=self._grounded_numbers(context),
+                    max_new_tokens=max_new_tokens,
+                )
+        else:
+            context = self.rag.get_context(query)
         if not context:
             # No RAG context - fallback to SLM with caveat
-            return self.slm.generate(
-                query + "\n[Note: No policy document match. Respond cautiously; do not invent numbers.]"
+            return self._slm_generate(
+                query + "\n[Note: No policy document match. Respond cautiously; do not invent numbers.]",
+                query,
+                self._grounded_numbers(),
+                session_id,
+                max_new_tokens,
             )
-        # Use SLM with RAG context for grounded generation
-        augmented = f"""The following is verified policy/knowledge. Use it to answer. Do NOT invent numbers.
-
-{context}
+        # Use SLM with RAG context for grounded generation (session transcripts are text-based,
+        # as is a request on a version whose chunk ids were already evicted)
+        augmented = RAG_PROMPT_PREAMBLE + context + RAG_PROMPT_QUERY + " " + query + RAG_PROMPT_INSTRUCTION
+        return self._slm_generate(augmented, query, self._grounded_numbers(context), session_id, max_new_tokens)
 
----
-
-User query: {query}
+    def _overload_response(self, query: str, metadata: dict, complex_query: bool) -> dict:
+        """
+        Answer without the SLM when a generation was shed or degraded, per admission.overload_policy:
+        "rag_context" returns the best verified policy excerpt for a query routed to Tier 3
+        (falling back to the hold message when nothing relevant is found); Tier-2 queries and
+        "hold_message" always get the hold message.
+        """
+        response = None
+        if self.admission.overload_policy == "rag_context" and complex_query:
+            results = self.rag.retrieve(query)
+            if results:
+                response = OVERLOAD_CONTEXT_PREFIX + self._excerpt(results[0]["text"], self.admission.summary_max_chars)
+                metadata["overload_policy"] = "rag_context"
+        if response is None:
+            response = self.admission.hold_message
+            metadata["overload_policy"] = "hold_message"
+        metadata["tier"] = "overload"
+        return {
+            "response": response,
+            "source": "overload",
+            "metadata": metadata,
+        }
 
-Provide a factual, policy-aligned response based on the above. If the answer is not in the context, say so and direct to official channels."""
-        return self.slm.generate(augmented)
+    @staticmethod
+    def _excerpt(text: str, max_chars: int) -> str:
+        """Leading part of a knowledge chunk, cut at a sentence end when it is too long."""
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars]
+        end = max(cut.rfind(". "), cut.rfind(".\n"))
+        return cut[:end + 1] if end > 0 else cut.rstrip() + "..."
 
-    def process(self, query: str) -> dict:
+    def process(self, query: str, session_id: Optional[str] = None, deadline_ms: Optional[float] = None) -> dict:
         """
         Process user query following exact priority order.
         Returns dict with: response, source (dataset|slm|rag), metadata.
+        With session_id, the turn joins that conversation: generative tiers see the
+        earlier turns (reusing the session's KV cache) and every answered turn is recorded.
+        metadata reports the dataset / SLM versions that served the query; a request
+        runs entirely on the versions active when it reached each tier, even across a reload.
+        deadline_ms (default admission.default_deadline_ms) bounds the generative tiers: they
+        are admitted through a bounded queue and their token budget shrinks to the time left.
+        A generation that cannot be served in time gets the overload reply (source "overload");
+        metadata.admission reports on_time / late / degraded / shed.
+        Every call is audit-logged (PII-masked, written off the request path); guardrail
+        rejections are logged with their reason and a hash of the query only.
         """
+        start = time.perf_counter()
+        try:
+            result = self._process(query, session_id, deadline_ms)
+        except Exception as e:
+            self.audit.log({
+                "query": query, "session_id": session_id, "error": f"{type(e).__name__}: {e}",
+                "latency_ms": round((time.perf_counter() - start) * 1000.0, 3),
+            })
+            raise
+        event = {
+            "query": query,
+            "source": result["source"],
+            "latency_ms": round((time.perf_counter() - start) * 1000.0, 3),
+            **result["metadata"],
+        }
+        if result["source"] == "guardrail_reject":
+            # Only the reason and a hash of the query are written (see audit_log.REDACTED_SOURCES)
+            event["reason"] = result["response"]
+        else:
+            event["response"] = result["response"]
+        self.audit.log(event)
+        return result
+
+    def _process(self, query: str, session_id: Optional[str], deadline_ms: Optional[float]) -> dict:
+        """Tier logic of process(), without audit logging."""
+        deadline = self.admission.deadline(deadline_ms)
         metadata = {"tier": None, "similarity_score": None}
+        if session_id is not None:
+            metadata["session_id"] = session_id
 
         # Guardrails (absolute enforcement)
         allowed, reason = self.guardrails.check(query)
@@ -94,32 +255,48 @@ Provide a factual, policy-aligned response based on the above. If the answer is
             }
 
         # --- Tier 1: Dataset Similarity Check ---
-        stored_response, score = self.dataset.search(query)
+        index = self.dataset.snapshot()
+        metadata["dataset_version"] = index.tag
+        stored_response, score = self.dataset.search(query, index)
         metadata["similarity_score"] = score
         if stored_response is not None:
             metadata["tier"] = "dataset"
+            if session_id is not None:
+                self.sessions.record_turn(session_id, query, stored_response)
             return {
                 "response": stored_response,  # EXACT, no modification
                 "source": "dataset",
                 "metadata": metadata,
             }
 
-        # --- Tier 2 vs Tier 3: SLM vs RAG ---
-        if self._is_complex_query(query):
-            # Tier 3: RAG for complex queries
-            metadata["tier"] = "rag"
-            response = self._generate_rag_response(query)
-            return {
-                "response": response,
-                "source": "rag",
-                "metadata": metadata,
-            }
-        else:
-            # Tier 2: SLM for non-complex queries
-            metadata["tier"] = "slm"
-            response = self.slm.generate(query)
-            return {
-                "response": response,
-                "source": "slm",
-                "metadata": metadata,
-            }
+        # --- Tier 2 vs Tier 3: SLM vs RAG (admission-controlled) ---
+        complex_query = self._is_complex_query(query)
+        with self.admission.admit(deadline, self.slm.ms_per_token) as overload:
+            budget = 0 if overload else self.admission.token_budget(
+                deadline, self.slm.max_new_tokens, self.slm.ms_per_token
+            )
+            if budget:
+                with self.slm.pinned() as version:
+                    metadata["slm_version"] = version.tag
+                    metadata["max_new_tokens"] = budget
+                    if complex_query:
+                        # Tier 3: RAG for complex queries
+                        metadata["tier"] = "rag"
+                        response = self._generate_rag_response(query, session_id, budget)
+                    else:
+                        # Tier 2: SLM for non-complex queries
+                        metadata["tier"] = "slm"
+                        response = self._slm_generate(
+                            query, query, self._grounded_numbers(), session_id, budget
+                        )
+        if not budget:
+            metadata["admission"] = overload or "degraded"
+            self.admission.record(metadata["admission"])
+            return self._overload_response(query, metadata, complex_query)
+        metadata["admission"] = self.admission.finish_outcome(deadline)
+        metadata["output_blocked"] = response == self.output_validator.fallback_response
+        return {
+            "response": response,
+            "source": metadata["tier"],
+            "metadata": metadata,
+        }
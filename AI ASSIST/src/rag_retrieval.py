@@ -6,11 +6,14 @@ Use ONLY for: interest explanations, EMI breakdowns, penalties, policy rules.
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+from src.embeddings import get_encoder
+
 
 class RAGRetriever:
     """
@@ -24,10 +27,13 @@ class RAGRetriever:
         self.knowledge_path = Path(kb_path) if Path(kb_path).is_absolute() else self.base_path / kb_path
         self.similarity_threshold = float(config.get("similarity_threshold", 0.7))
         self.max_context_chunks = int(config.get("max_context_chunks", 4))
+        self.max_context_tokens = int(config.get("max_context_tokens", 1024))
         self.embedding_model_name = config.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
         self._model = None
         self._chunks = []
         self._embeddings = None
+        self._token_keys: List[Optional[str]] = []  # keys chunks are tokenized for, oldest first
+        self._tokenize_lock = threading.Lock()
 
     def _load_knowledge(self) -> List[dict]:
         """Load and chunk knowledge documents."""
@@ -68,13 +74,9 @@ class RAGRetriever:
         return self._chunks
 
     def _get_model(self):
-        """Lazy load embedding model."""
+        """Lazy load the (shared) embedding encoder; backend per embedding_model."""
         if self._model is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-                self._model = SentenceTransformer(self.embedding_model_name)
-            except ImportError:
-                raise ImportError("sentence-transformers required. pip install sentence-transformers")
+            self._model = get_encoder(self.embedding_model_name)
         return self._model
 
     def _build_embeddings(self) -> np.ndarray:
@@ -122,3 +124,53 @@ class RAGRetriever:
         if not results:
             return ""
         return "\n\n".join(r["text"] for r in results)
+
+    def tokenize_chunks(self, encode: Callable[[str], List[int]], key: Optional[str] = None) -> None:
+        """
+        Tokenize every chunk once and keep the ids as int32 arrays, so prompt assembly
+        never re-tokenizes policy text. Called when a tokenizer (SLM version) is loaded,
+        not per request; a key already tokenized is a no-op.
+        encode must return continuation ids (no BOS), e.g. SLMInference.encode_continuation.
+        key identifies the tokenizer (e.g. the SLM version tag); ids are kept for the
+        two most recent keys so requests still on the previous model version keep working.
+        """
+        with self._tokenize_lock:
+            if key in self._token_keys:
+                return
+            keep = (self._token_keys + [key])[-2:]
+            for chunk in self._load_knowledge():
+                # Swap in a new dict so concurrent readers never see a half-updated one
+                ids_by_key = {k: v for k, v in chunk.get("token_ids", {}).items() if k in keep}
+                ids_by_key[key] = np.asarray(encode(chunk["text"]), dtype=np.int32)
+                chunk["token_ids"] = ids_by_key
+            self._token_keys = keep
+
+    def get_context_ids(
+        self,
+        query: str,
+        separator_ids: Sequence[int],
+        max_tokens: Optional[int] = None,
+        key: Optional[str] = None,
+    ) -> Optional[Tuple[List[np.ndarray], str]]:
+        """
+        Pre-tokenized context for RAG prompt assembly.
+        Returns (token segments, context text): the best chunks joined by separator_ids,
+        taken in score order while the exact token count stays within max_tokens.
+        Returns None when the chunks are not tokenized for key (see tokenize_chunks).
+        """
+        budget = self.max_context_tokens if max_tokens is None else max_tokens
+        segments, texts, used = [], [], 0
+        sep = np.asarray(separator_ids, dtype=np.int32)
+        for r in self.retrieve(query):
+            ids = r.get("token_ids", {}).get(key)
+            if ids is None:
+                return None
+            cost = len(ids) + (len(sep) if segments else 0)
+            if used + cost > budget:
+                continue
+            if segments:
+                segments.append(sep)
+            segments.append(ids)
+            texts.append(r["text"])
+            used += cost
+        return segments, "\n\n".join(texts)
@@ -0,0 +1,239 @@
+"""
+BFSI Call Center AI - Compact Response Store (Tier 1)
+Memory-mapped storage for Alpaca dataset text fields.
+Text lives in one UTF-8 blob addressed through an offset table, so a lookup by
+index is O(1) and per-process memory does not grow with Python object count.
+"""
+
+import json
+import mmap
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+FIELDS = ("instruction", "input", "output")
+
+_READ_CHUNK = 1 << 16
+
+
+def iter_records(
+    path: Union[str, Path],
+    on_error: Optional[Callable[[int, ValueError], None]] = None,
+) -> Iterator[dict]:
+    """
+    Stream Alpaca records from a .jsonl file (one object per line) or a .json
+    file holding an array (or a single object), without parsing the whole file at once.
+    With on_error, a malformed .jsonl line is reported as on_error(line number, error)
+    and skipped; otherwise (and always for .json, which cannot resume) it raises.
+    """
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    if on_error is None:
+                        raise
+                    on_error(line_no, e)
+                    continue
+                yield record
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_ws() -> None:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        skip_ws()
+        if pos >= len(buf):
+            return
+        if buf[pos] != "[":
+            # Single top-level object: nothing to stream
+            yield json.loads(buf[pos:] + f.read())
+            return
+        pos += 1
+        while True:
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError(f"Unterminated JSON array in {path}")
+            if buf[pos] == "]":
+                return
+            if buf[pos] == ",":
+                pos += 1
+                continue
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof or not fill():
+                        raise
+                    continue
+                # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+                if end == len(buf) and not eof and fill():
+                    continue
+                break
+            pos = end
+            yield obj
+
+
+class ResponseStore:
+    """
+    Read-only, memory-mapped store of dataset text fields.
+    Files: <path>.bin (UTF-8 text), <path>.idx.npy (uint64 offsets), <path>.meta.json.
+    """
+
+    def __init__(self, store_path: Union[str, Path]):
+        self.store_path = Path(store_path)
+        self.meta = json.loads(self._meta_path(self.store_path).read_text(encoding="utf-8"))
+        self.fields = tuple(self.meta.get("fields", FIELDS))
+        self._offsets = np.load(self._idx_path(self.store_path), mmap_mode="r")
+        self._file = open(self._bin_path(self.store_path), "rb")
+        size = self._offsets[-1] if len(self._offsets) else 0
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._view = memoryview(self._data)
+
+    @staticmethod
+    def _bin_path(store_path: Path) -> Path:
+        return store_path.with_name(store_path.name + ".bin")
+
+    @staticmethod
+    def _idx_path(store_path: Path) -> Path:
+        return store_path.with_name(store_path.name + ".idx.npy")
+
+    @staticmethod
+    def _meta_path(store_path: Path) -> Path:
+        return store_path.with_name(store_path.name + ".meta.json")
+
+    @staticmethod
+    def source_signature(source_path: Union[str, Path]) -> dict:
+        """Identity of a source dataset file, used to detect stale stores."""
+        st = Path(source_path).stat()
+        return {"source": str(Path(source_path).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    @classmethod
+    def is_fresh(cls, store_path: Union[str, Path], source_path: Union[str, Path]) -> bool:
+        """True if a store exists at store_path and was built from the current source file."""
+        store_path = Path(store_path)
+        meta_path = cls._meta_path(store_path)
+        if not (meta_path.exists() and cls._bin_path(store_path).exists() and cls._idx_path(store_path).exists()):
+            return False
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        return meta.get("signature") == cls.source_signature(source_path)
+
+    @classmethod
+    def build(
+        cls,
+        records: Iterable[dict],
+        store_path: Union[str, Path],
+        signature: Optional[dict] = None,
+    ) -> "ResponseStore":
+        """
+        Write a store from an iterable of Alpaca records (streamed, one record at a time).
+        Files are written in a private temporary directory next to store_path and
+        renamed into place when complete, so concurrent builders never share files.
+        """
+        store_path = Path(store_path)
+        store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=store_path.name + ".", suffix=".tmp", dir=store_path.parent))
+        tmp = tmp_dir / store_path.name
+        try:
+            offsets = array("Q", [0])
+            count = 0
+            pos = 0
+            with open(cls._bin_path(tmp), "wb") as out:
+                for item in records:
+                    for field in FIELDS:
+                        data = str(item.get(field) or "").encode("utf-8")
+                        out.write(data)
+                        pos += len(data)
+                        offsets.append(pos)
+                    count += 1
+            with open(cls._idx_path(tmp), "wb") as f:
+                np.save(f, np.frombuffer(offsets, dtype=np.uint64))
+            meta = {"fields": list(FIELDS), "count": count, "signature": signature}
+            cls._meta_path(tmp).write_text(json.dumps(meta), encoding="utf-8")
+
+            # Metadata last: is_fresh() only accepts the store once it is complete
+            for path_fn in (cls._bin_path, cls._idx_path, cls._meta_path):
+                path_fn(tmp).replace(path_fn(store_path))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return cls(store_path)
+
+    @classmethod
+    def move(cls, src: Union[str, Path], dst: Union[str, Path], signature: Optional[dict] = None) -> None:
+        """
+        Rename a (closed) store's files from src to dst, optionally stamping the source
+        signature, e.g. when the source file is only final after the store was built.
+        """
+        src, dst = Path(src), Path(dst)
+        if signature is not None:
+            meta = json.loads(cls._meta_path(src).read_text(encoding="utf-8"))
+            meta["signature"] = signature
+            cls._meta_path(src).write_text(json.dumps(meta), encoding="utf-8")
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        for path_fn in (cls._bin_path, cls._idx_path, cls._meta_path):
+            path_fn(src).replace(path_fn(dst))
+
+    @classmethod
+    def from_source(cls, source_path: Union[str, Path], store_path: Union[str, Path]) -> "ResponseStore":
+        """Open the store for source_path, (re)building it first if missing or stale."""
+        if not cls.is_fresh(store_path, source_path):
+            return cls.build(iter_records(source_path), store_path, cls.source_signature(source_path))
+        return cls(store_path)
+
+    def __len__(self) -> int:
+        return int(self.meta.get("count", 0))
+
+    def get_bytes(self, index: int, field: str = "output") -> memoryview:
+        """Zero-copy view of a field's UTF-8 bytes."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Record index out of range: {index}")
+        slot = index * len(self.fields) + self.fields.index(field)
+        start, end = int(self._offsets[slot]), int(self._offsets[slot + 1])
+        return self._view[start:end]
+
+    def get(self, index: int, field: str = "output") -> str:
+        """Decoded text of a field for the record at index."""
+        return str(self.get_bytes(index, field), "utf-8")
+
+    def iter_texts(self, field: str) -> Iterator[str]:
+        """Iterate a single field across all records."""
+        for i in range(len(self)):
+            yield self.get(i, field)
+
+    def close(self) -> None:
+        self._view.release()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
@@ -0,0 +1,248 @@
+"""
+BFSI Call Center AI - Multi-Turn Conversation Sessions
+Tracks conversation turns per session and keeps each session's SLM KV cache
+(past_key_values) between turns, so a follow-up only prefills the new turn.
+Memory is bounded: at most max_cached_sessions caches stay resident (LRU);
+older caches are offloaded to disk when offload_dir is set, otherwise dropped
+and rebuilt from the transcript on the session's next generative turn.
+"""
+
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class Session:
+    """One conversation: turn history plus the token sequence covered by its KV cache."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turns: List[Tuple[str, str]] = []   # (query, response)
+        self.transcript: List[Tuple[str, str]] = []  # (prompt as prefilled, e.g. with RAG context, response)
+        self.token_ids: List[int] = []           # transcript tokens fed to / produced by the SLM (no EOS)
+        self.pending: List[Tuple[str, str]] = [] # turns answered without the SLM, not yet tokenized
+        self.past_key_values = None              # covers token_ids (except possibly the last token)
+        self.offload_path: Optional[Path] = None
+        self.model_tag: Optional[str] = None     # SLM version the cache was computed with
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def reset_cache(self) -> None:
+        """Forget tokens and cache; the next generation re-prefills from self.transcript."""
+        self.token_ids = []
+        self.pending = []
+        self.past_key_values = None
+        if self.offload_path is not None:
+            self.offload_path.unlink(missing_ok=True)
+            self.offload_path = None
+
+
+class SessionManager:
+    """
+    Session registry with LRU-bounded KV-cache residency.
+    Generative turns are serialized per session; different sessions run concurrently.
+    """
+
+    def __init__(self, config: dict, slm, base_path: Optional[str] = None):
+        self.slm = slm
+        self.base_path = Path(base_path) if base_path else Path(__file__).parent.parent
+        self.max_sessions = int(config.get("max_sessions", 1000))
+        self.max_cached_sessions = int(config.get("max_cached_sessions", 32))
+        self.max_session_tokens = int(config.get("max_session_tokens", 1536))
+        offload = config.get("offload_dir") or ""
+        self.offload_dir = (Path(offload) if Path(offload).is_absolute() else self.base_path / offload) if offload else None
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._resident: "OrderedDict[str, None]" = OrderedDict()  # sessions holding an in-memory cache
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        """Return (creating if needed) the session and mark it most recently used."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    _, evicted = self._sessions.popitem(last=False)
+                    self._resident.pop(evicted.session_id, None)
+                    evicted.reset_cache()
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def end(self, session_id: str) -> None:
+        """Drop a session and its cache."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            self._resident.pop(session_id, None)
+        if session is not None:
+            session.reset_cache()
+
+    def history(self, session_id: str) -> List[Tuple[str, str]]:
+        """(query, response) turns recorded so far."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        return list(session.turns) if session else []
+
+    def record_turn(self, session_id: str, query: str, response: str) -> None:
+        """Record a turn answered without the SLM (e.g. Tier 1); tokenized lazily on the next generation."""
+        session = self.get(session_id)
+        with session.lock:
+            session.turns.append((query, response))
+            session.transcript.append((query, response))
+            if session.token_ids:
+                session.pending.append((query, response))
+
+    def generate(
+        self,
+        session_id: str,
+        prompt: str,
+        query: Optional[str] = None,
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Generate the next response in a session. prompt is what the SLM sees for this
+        turn (it may include RAG context); query is what is kept in the turn history.
+        max_new_tokens overrides the SLM's configured budget for this turn.
+        """
+        query = prompt if query is None else query
+        session = self.get(session_id)
+        with session.lock, self.slm.pinned() as version:
+            if session.model_tag != version.tag:
+                # Cache (and token ids) from a previous model version are not reusable
+                session.reset_cache()
+                session.model_tag = version.tag
+            self._restore(session)
+            if session.token_ids:
+                suffix = "".join(self.slm.format_turn(q) + r for q, r in session.pending)
+                suffix += self.slm.format_turn(prompt)
+                input_ids = session.token_ids + self.slm.encode_continuation(suffix)
+            else:
+                input_ids = []
+            if not input_ids or len(input_ids) + self.slm.max_new_tokens > self.max_session_tokens:
+                input_ids = self._rebuild_ids(session, prompt)
+                session.past_key_values = None
+
+            response, sequence, cache = self.slm.generate_cached(
+                input_ids, session.past_key_values, query=prompt,
+                validator=validator, allowed_numbers=allowed_numbers, max_new_tokens=max_new_tokens,
+            )
+            session.turns.append((query, response))
+            session.transcript.append((prompt, response))
+            session.pending = []
+            if cache is None:
+                session.token_ids = []
+                session.past_key_values = None
+            else:
+                # Drop the trailing EOS: the next turn's template follows the response directly,
+                # as in a rebuilt transcript. The cache never covers the last generated token.
+                eos = version.tokenizer.eos_token_id
+                while eos is not None and sequence and sequence[-1] == eos:
+                    sequence = sequence[:-1]
+                session.token_ids = sequence
+                session.past_key_values = cache
+        self._mark_resident(session)
+        return response
+
+    def _rebuild_ids(self, session: Session, prompt: str) -> List[int]:
+        """
+        Tokenize the transcript from the prompts originally prefilled (RAG context included),
+        dropping the oldest turns to fit the budget.
+        """
+        turns = list(session.transcript)
+        while True:
+            ids = self.slm.encode_prompt(self.slm.format_transcript(turns + [(prompt, "")]))
+            if not turns or len(ids) + self.slm.max_new_tokens <= self.max_session_tokens:
+                return ids
+            turns.pop(0)
+
+    def _mark_resident(self, session: Session) -> None:
+        """
+        Track the session as holding a resident cache and evict the least recently used beyond the limit.
+        Never waits for a victim that is busy (e.g. mid-generation): it stays tracked as least
+        recently used and is evicted by a later call.
+        """
+        evict = []
+        with self._lock:
+            if session.past_key_values is None:
+                self._resident.pop(session.session_id, None)
+                return
+            self._resident[session.session_id] = None
+            self._resident.move_to_end(session.session_id)
+            while len(self._resident) > self.max_cached_sessions:
+                sid, _ = self._resident.popitem(last=False)
+                victim = self._sessions.get(sid)
+                if victim is not None:
+                    evict.append(victim)
+        for victim in evict:
+            if not victim.lock.acquire(blocking=False):
+                with self._lock:
+                    if victim.session_id not in self._resident and victim.session_id in self._sessions:
+                        self._resident[victim.session_id] = None
+                        self._resident.move_to_end(victim.session_id, last=False)
+                continue
+            try:
+                with self._lock:
+                    # Used again since it was picked: keep it resident
+                    if victim.session_id in self._resident:
+                        continue
+                self._offload(victim)
+            finally:
+                victim.lock.release()
+
+    def _offload(self, session: Session) -> None:
+        """Move a session's cache to disk (or drop it if offloading is disabled)."""
+        if session.past_key_values is None:
+            return
+        if self.offload_dir is None:
+            session.reset_cache()
+            return
+        import torch
+        from src.slm_inference import cache_to_legacy
+
+        self.offload_dir.mkdir(parents=True, exist_ok=True)
+        # A unique file per offload: sanitized session ids can collide ("cust:1" / "cust_1")
+        fd, name = tempfile.mkstemp(
+            prefix=re.sub(r"[^A-Za-z0-9_.-]", "_", session.session_id)[:64] + ".", suffix=".pt", dir=self.offload_dir
+        )
+        path = Path(name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                torch.save({
+                    "session_id": session.session_id,
+                    "token_ids": session.token_ids,
+                    "cache": cache_to_legacy(session.past_key_values),
+                }, f)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        session.past_key_values = None
+        session.offload_path = path
+
+    def _restore(self, session: Session) -> None:
+        """Reload an offloaded cache before the session's next generation."""
+        if session.offload_path is None:
+            return
+        import torch
+        from src.slm_inference import cache_from_legacy
+
+        path, session.offload_path = session.offload_path, None
+        try:
+            state = torch.load(path, weights_only=False)
+            if state["session_id"] != session.session_id:
+                raise KeyError("session_id")
+            session.token_ids = state["token_ids"]
+            session.past_key_values = cache_from_legacy(state["cache"])
+        except (OSError, RuntimeError, KeyError):
+            session.token_ids = []
+            session.past_key_values = None
+        finally:
+            path.unlink(missing_ok=True)
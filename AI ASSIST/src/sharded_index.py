@@ -0,0 +1,141 @@
+"""
+BFSI Call Center AI - Sharded Tier-1 Index (scatter-gather)
+The dataset embedding matrix is split into contiguous row shards, each scored by
+a local worker process. A query vector is sent to every worker over a pipe; each
+returns the top-k (global row, score) of its shard and the coordinator merges
+them. The merged best score is the exact global maximum, so Tier-1 threshold
+semantics are unchanged. Workers load their slice from the on-disk .npy matrix,
+so no embeddings cross the pipe.
+"""
+
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
+
+# BLAS thread settings for workers: one core per shard, no oversubscription
+_BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def top_k_rows(matrix: np.ndarray, query: np.ndarray, k: int, offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k rows of matrix by dot product with query, best first (ties: lowest row).
+    Returns (row indices + offset, scores).
+    """
+    scores = matrix @ query
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    candidates = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+    # Include every row tied with the k-th score so tie-breaking by row index is exact
+    candidates = np.union1d(candidates, np.flatnonzero(scores == scores[candidates].min()))
+    order = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+    return order.astype(np.int64) + offset, scores[order]
+
+
+def _shard_worker(conn, embeddings_path: str, start: int, end: int) -> None:
+    """Worker process: hold rows [start, end) in memory and answer (query, k) requests until None."""
+    matrix = np.ascontiguousarray(np.load(embeddings_path, mmap_mode="r")[start:end], dtype=np.float32)
+    conn.send(end - start)
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        query, k = request
+        conn.send(top_k_rows(matrix, query, k, start))
+    conn.close()
+
+
+@contextmanager
+def _single_threaded_blas() -> Iterator[None]:
+    """Spawned workers inherit the environment: pin their BLAS to one thread while starting them."""
+    saved = {var: os.environ.get(var) for var in _BLAS_THREAD_VARS}
+    os.environ.update({var: "1" for var in _BLAS_THREAD_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+class ShardedIndex:
+    """
+    Row-sharded embedding matrix served by local worker processes.
+    Thread-safe: concurrent queries pipeline through the workers (one in flight per worker):
+    each shard is released as soon as its reply is read, so the next query can use it
+    while the current one still waits on slower shards.
+    """
+
+    def __init__(self, embeddings_path: Union[str, Path], num_shards: int):
+        embeddings_path = str(embeddings_path)
+        rows = int(np.load(embeddings_path, mmap_mode="r").shape[0])
+        num_shards = max(1, min(int(num_shards), rows))
+        bounds = np.linspace(0, rows, num_shards + 1).astype(int)
+        ctx = multiprocessing.get_context("spawn")
+        self.rows = rows
+        self._conns = []
+        self._locks: List[threading.Lock] = []
+        self._processes = []
+        with _single_threaded_blas():
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                parent, child = ctx.Pipe()
+                process = ctx.Process(
+                    target=_shard_worker, args=(child, embeddings_path, int(start), int(end)),
+                    name=f"tier1-shard-{start}", daemon=True,
+                )
+                process.start()
+                child.close()
+                self._conns.append(parent)
+                self._locks.append(threading.Lock())
+                self._processes.append(process)
+        for conn in self._conns:
+            conn.recv()  # shard loaded
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._conns)
+
+    def top_k(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Global top-k (row indices, scores), best first: scatter to every shard, merge the results."""
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(-1)
+        # Locks are always taken in shard order, so concurrent queries cannot deadlock
+        sent = received = 0
+        results = []
+        try:
+            for lock, conn in zip(self._locks, self._conns):
+                lock.acquire()
+                sent += 1
+                conn.send((query, k))
+            for lock, conn in zip(self._locks, self._conns):
+                results.append(conn.recv())
+                received += 1
+                lock.release()
+        finally:
+            for lock in self._locks[received:sent]:
+                lock.release()
+        indices = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        order = np.lexsort((indices, -scores))[:k]
+        return indices[order], scores[order]
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        for lock, conn in zip(self._locks, self._conns):
+            with lock:
+                try:
+                    conn.send(None)
+                except (OSError, ValueError):
+                    pass
+                conn.close()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._conns, self._locks, self._processes = [], [], []
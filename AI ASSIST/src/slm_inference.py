@@ -4,8 +4,149 @@ Used ONLY when no strong dataset similarity match exists.
 Runs locally on modest hardware.
 """
 
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+PROMPT_HEADER = """Below is an instruction that describes a task. Write a response that appropriately completes the request.
+
+### Instruction:
+You are a professional BFSI call center assistant. Respond helpfully, accurately, and in a compliant manner. Do NOT guess financial numbers, interest rates, or policy details. If unsure, direct the customer to official channels.
+
+### Input:
+"""
+
+PROMPT_FOOTER = """
+
+### Response:
+"""
+
+# Separator before each follow-up turn in a multi-turn transcript
+TURN_TEMPLATE = "\n\n### Input:\n{query}\n\n### Response:\n"
+
+
+def _output_validator_criteria(validator, allowed: set, tokenizer, prompt_length: int):
+    """
+    Build a transformers StoppingCriteria that aborts decoding as soon as the
+    generated text contains an ungrounded financial figure.
+    The generated text is only re-decoded for a few steps after a numeric token,
+    i.e. while a number (and any unit such as "%" or "lakh") is being completed.
+    """
+    import torch
+    from transformers import StoppingCriteria
+
+    recheck_steps = 3
+
+    class _OutputValidatorCriteria(StoppingCriteria):
+        def __init__(self):
+            self.violation = None
+            self._countdown = 0
+
+        def __call__(self, input_ids, scores, **kwargs):
+            piece = tokenizer.decode(input_ids[0, -1:], skip_special_tokens=True)
+            if any(ch.isdigit() for ch in piece):
+                self._countdown = recheck_steps
+            elif self._countdown:
+                self._countdown -= 1
+                text = tokenizer.decode(input_ids[0, prompt_length:], skip_special_tokens=True)
+                self.violation = validator.find_violation(text, allowed, final=False)
+            stop = self.violation is not None
+            return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+    return _OutputValidatorCriteria()
+
+
+def _decode_timer():
+    """
+    Build a transformers StoppingCriteria that never stops decoding but records when
+    each new token is produced. The first token's time includes prefill, so only the
+    steps after it are decode time.
+    """
+    import torch
+    from transformers import StoppingCriteria
+
+    class _DecodeTimer(StoppingCriteria):
+        def __init__(self):
+            self.first = None
+            self.last = None
+            self.steps = 0
+
+        def __call__(self, input_ids, scores, **kwargs):
+            self.last = time.perf_counter()
+            if self.first is None:
+                self.first = self.last
+            self.steps += 1
+            return torch.zeros((input_ids.shape[0],), dtype=torch.bool, device=input_ids.device)
+
+        def decode_time(self) -> Tuple[int, float]:
+            """(decode steps after the first token, seconds they took)."""
+            if self.steps < 2:
+                return 0, 0.0
+            return self.steps - 1, self.last - self.first
+
+    return _DecodeTimer()
+
+
+# A number close to the end of streamed text may still gain digits or a unit ("7" -> "7.5 lakh")
+_TRAILING_FIGURE = re.compile(r"(?:(?:rs\.?|inr|\u20b9|\$)\s*)?\d[\d,.]*\D{0,16}$", re.IGNORECASE)
+
+
+def _held_back_length(text: str) -> int:
+    """Length of streamed text that is safe to emit: everything before a still-forming trailing figure."""
+    m = _TRAILING_FIGURE.search(text)
+    return m.start() if m else len(text)
+
+
+def cache_to_legacy(past_key_values):
+    """KV cache as a tuple of per-layer (key, value) tensors, for storage or batching."""
+    if past_key_values is None or isinstance(past_key_values, tuple):
+        return past_key_values
+    if hasattr(past_key_values, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+    return past_key_values.to_legacy_cache()
+
+
+def cache_from_legacy(legacy):
+    """Inverse of cache_to_legacy: wrap legacy tuples in a DynamicCache when available."""
+    if legacy is None:
+        return None
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return legacy
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(legacy)
+    return DynamicCache(legacy)
+
+
+def model_version_tag(model_path: str) -> str:
+    """Version tag for a model: directory name plus a digest of its files' sizes and mtimes."""
+    path = Path(model_path)
+    if not path.is_dir():
+        return model_path
+    digest = hashlib.sha1()
+    for f in sorted(path.iterdir()):
+        if f.is_file():
+            st = f.stat()
+            digest.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns};".encode("utf-8"))
+    return f"{path.name}@{digest.hexdigest()[:10]}"
+
+
+class ModelVersion:
+    """A loaded model + tokenizer, plus the token-id caches that are only valid for it."""
+
+    def __init__(self, model, tokenizer, tag: str):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.tag = tag
+        # Token ids of static prompt text, tokenized once per loaded tokenizer
+        self.header_ids = None
+        self.segment_cache = {}
 
 
 class SLMInference:
@@ -13,6 +154,8 @@ class SLMInference:
     Tier 2: Local fine-tuned SLM.
     Generates response when no dataset match.
     Uses TinyLlama or fine-tuned weights.
+    Weights can be hot-swapped with reload(): new requests switch to the new version
+    atomically while in-flight ones (pinned via pinned()) finish on the old one.
     """
 
     def __init__(self, config: dict, base_path: Optional[str] = None):
@@ -22,43 +165,174 @@ class SLMInference:
         self.max_new_tokens = int(config.get("max_new_tokens", 256))
         self.temperature = float(config.get("temperature", 0.3))
         self.use_finetuned = config.get("use_finetuned", True)
-        self._model = None
-        self._tokenizer = None
+        # Per-token decode cost (prefill and queueing excluded), refined from observed generations;
+        # used to size token budgets to a request's deadline
+        self.ms_per_token = float(config.get("ms_per_token", 50.0))
+        self._decode_lock = threading.Lock()
+        self._version: Optional[ModelVersion] = None
+        self._version_lock = threading.Lock()
+        self._version_hooks: List[Callable[[str], None]] = []
+        self._local = threading.local()
+        # Continuous batching: concurrent generate() calls share one decoding loop
+        scheduler_cfg = config.get("scheduler") or {}
+        self.scheduler = None
+        if scheduler_cfg.get("enabled", False):
+            from src.batch_scheduler import GenerationScheduler
+            self.scheduler = GenerationScheduler(self, scheduler_cfg)
+
+    def current_version(self) -> ModelVersion:
+        """The version used by this thread: the pinned one, else the active one (loaded lazily)."""
+        pinned = getattr(self._local, "version", None)
+        if pinned is not None:
+            return pinned
+        if self._version is None:
+            with self._version_lock:
+                if self._version is None:
+                    version = self._load_version()
+                    self._run_version_hooks(version, self._version_hooks)
+                    self._version = version
+        return self._version
+
+    def add_version_hook(self, hook: Callable[[str], None]) -> None:
+        """
+        Call hook(tag) for every model version before it starts serving (and right away
+        for one already active), with that version pinned so tokenizer calls use it.
+        Used to precompute per-tokenizer data, e.g. RAG chunk token ids.
+        """
+        self._version_hooks.append(hook)
+        if self._version is not None:
+            self._run_version_hooks(self._version, [hook])
+
+    def _run_version_hooks(self, version: ModelVersion, hooks: List[Callable[[str], None]]) -> None:
+        previous = getattr(self._local, "version", None)
+        self._local.version = version
+        try:
+            for hook in hooks:
+                hook(version.tag)
+        finally:
+            self._local.version = previous
+
+    @contextmanager
+    def pinned(self):
+        """Pin the current model version for this thread, so a whole request uses one version."""
+        if getattr(self._local, "version", None) is not None:
+            yield self._local.version
+            return
+        self._local.version = self.current_version()
+        try:
+            yield self._local.version
+        finally:
+            self._local.version = None
+
+    @property
+    def version_tag(self) -> Optional[str]:
+        """Tag of the active model version, or None if not loaded yet."""
+        return self._version.tag if self._version is not None else None
 
     def _load_model(self):
-        """Lazy load model and tokenizer."""
-        if self._model is not None:
-            return self._model, self._tokenizer
+        """Lazy load model and tokenizer (of the pinned / active version)."""
+        version = self.current_version()
+        return version.model, version.tokenizer
+
+    def _load_version(self, weights_path: Optional[Path] = None, fallback: bool = True) -> ModelVersion:
+        """
+        Load a model + tokenizer; prefers fine-tuned weights, falls back to the base model.
+        With fallback=False (hot swap) broken weights raise instead of silently serving the base model.
+        """
         try:
             from transformers import AutoModelForCausalLM, AutoTokenizer
         except ImportError:
             raise ImportError("transformers required. pip install transformers torch")
 
         # Prefer fine-tuned weights if available
-        model_path = str(self.weights_path) if self.weights_path.exists() and self.use_finetuned else self.model_name
+        weights_path = weights_path or self.weights_path
+        model_path = str(weights_path) if weights_path.exists() and self.use_finetuned else self.model_name
         tokenizer_path = model_path
 
         try:
-            self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-            self._model = AutoModelForCausalLM.from_pretrained(
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+            model = AutoModelForCausalLM.from_pretrained(
                 model_path,
                 torch_dtype="auto",
                 device_map="auto" if self._has_cuda() else None,
             )
-            if self._model.device.type == "cpu":
-                self._model = self._model.float()
+            if model.device.type == "cpu":
+                model = model.float()
         except Exception:
             # Fallback to base model if fine-tuned not found
-            if model_path != self.model_name:
-                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self._model = AutoModelForCausalLM.from_pretrained(
+            if fallback and model_path != self.model_name:
+                model_path = self.model_name
+                tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                model = AutoModelForCausalLM.from_pretrained(
                     self.model_name,
                     torch_dtype="auto",
                     device_map="auto" if self._has_cuda() else None,
                 )
             else:
                 raise
-        return self._model, self._tokenizer
+        model.eval()
+        return ModelVersion(model, tokenizer, model_version_tag(model_path))
+
+    def _warm_up(self, version: ModelVersion) -> None:
+        """Run one short generation so the first real request does not pay one-off costs."""
+        import torch
+
+        ids = torch.tensor([version.tokenizer.encode(self._format_prompt("Hello"))], device=version.model.device)
+        with torch.no_grad():
+            version.model.generate(
+                input_ids=ids,
+                attention_mask=torch.ones_like(ids),
+                max_new_tokens=1,
+                do_sample=False,
+                pad_token_id=version.tokenizer.eos_token_id,
+            )
+
+    def reload(self, weights_path: Optional[str] = None) -> Future:
+        """
+        Load new weights in the background, warm them up and run the version hooks,
+        then switch atomically.
+        Requests started before the switch finish on the old version.
+        Returns a Future resolving to the new version tag (or raising the load error;
+        the old version stays active on failure).
+        """
+        path = Path(weights_path) if weights_path else self.weights_path
+        if not path.is_absolute():
+            path = self.base_path / path
+        result: Future = Future()
+
+        def _run() -> None:
+            try:
+                if not path.exists():
+                    raise FileNotFoundError(f"SLM weights not found: {path}")
+                version = self._load_version(path, fallback=False)
+                self._warm_up(version)
+                self._run_version_hooks(version, self._version_hooks)
+                with self._version_lock:
+                    self._version = version
+                result.set_result(version.tag)
+            except BaseException as e:
+                result.set_exception(e)
+
+        threading.Thread(target=_run, name="slm-reload", daemon=True).start()
+        return result
+
+    def _record_decode(self, tokens: int, seconds: float) -> None:
+        """
+        Fold observed decode steps into the ms_per_token moving average. Callers pass
+        only the time between the first and last new token, so prefill and queueing
+        (which grow under load) do not inflate the estimate and shrink token budgets.
+        """
+        if tokens > 0:
+            with self._decode_lock:
+                self.ms_per_token += 0.2 * (seconds * 1000.0 / tokens - self.ms_per_token)
+
+    @staticmethod
+    def _timed_criteria(stopping_criteria):
+        """(decode timer, StoppingCriteriaList of the timer plus any given criteria)."""
+        from transformers import StoppingCriteriaList
+
+        timer = _decode_timer()
+        return timer, StoppingCriteriaList([timer, *(stopping_criteria or [])])
 
     def _has_cuda(self) -> bool:
         try:
@@ -69,41 +343,273 @@ class SLMInference:
 
     def _format_prompt(self, query: str) -> str:
         """Format query for instruction-following model."""
-        return f"""Below is an instruction that describes a task. Write a response that appropriately completes the request.
+        return PROMPT_HEADER + query + PROMPT_FOOTER
 
-### Instruction:
-You are a professional BFSI call center assistant. Respond helpfully, accurately, and in a compliant manner. Do NOT guess financial numbers, interest rates, or policy details. If unsure, direct the customer to official channels.
+    def format_turn(self, query: str) -> str:
+        """Format a follow-up turn appended to an existing transcript."""
+        return TURN_TEMPLATE.format(query=query)
 
-### Input:
-{query}
+    def format_transcript(self, turns: List[Tuple[str, str]]) -> str:
+        """Full prompt text for (query, response) turns; the last response may be empty."""
+        if not turns:
+            return ""
+        text = self._format_prompt(turns[0][0]) + turns[0][1]
+        for query, response in turns[1:]:
+            text += self.format_turn(query) + response
+        return text
 
-### Response:
-"""
+    def encode_continuation(self, text: str) -> List[int]:
+        """
+        Token ids for text appended mid-sequence: no BOS and no leading-space artefact.
+        Uses a newline anchor, since SentencePiece tokenizers prepend a space to a bare segment.
+        """
+        _, tokenizer = self._load_model()
+        anchor = tokenizer.encode("\n", add_special_tokens=False)
+        ids = tokenizer.encode("\n" + text, add_special_tokens=False)
+        if ids[:len(anchor)] == anchor:
+            return ids[len(anchor):]
+        return tokenizer.encode(text, add_special_tokens=False)
+
+    def encode_prompt(self, text: str) -> List[int]:
+        """Token ids for text at the start of a sequence (with BOS)."""
+        _, tokenizer = self._load_model()
+        return tokenizer.encode(text)
 
-    def generate(self, query: str) -> str:
+    def segment_ids(self, text: str) -> List[int]:
+        """Continuation token ids for static template text, tokenized once and cached."""
+        cache = self.current_version().segment_cache
+        ids = cache.get(text)
+        if ids is None:
+            ids = self.encode_continuation(text)
+            cache[text] = ids
+        return ids
+
+    def build_prompt_ids(self, segments: Iterable[Sequence[int]]) -> List[int]:
+        """
+        Assemble prompt token ids from pre-tokenized segments wrapped in the
+        instruction template (BOS + header ... response marker). The header and
+        footer are tokenized once; callers supply cached ids for static text.
+        """
+        version = self.current_version()
+        if version.header_ids is None:
+            version.header_ids = self.encode_prompt(PROMPT_HEADER)
+        ids = list(version.header_ids)
+        for segment in segments:
+            ids.extend(int(t) for t in segment)
+        ids.extend(self.segment_ids(PROMPT_FOOTER))
+        return ids
+
+    def query_prompt_ids(self, query: str) -> List[int]:
+        """Prompt token ids for a single query; only the query itself is tokenized."""
+        return self.build_prompt_ids([self.encode_continuation(query)])
+
+    def _stopping_criteria(self, validator, allowed_numbers: Optional[set], query: str, tokenizer, prompt_length: int):
+        """(criteria, allowed, StoppingCriteriaList) for an optional OutputValidator."""
+        if validator is None or not validator.enabled:
+            return None, None, None
+        from transformers import StoppingCriteriaList
+        allowed = validator.allowed_numbers([query]) | (allowed_numbers or set())
+        criteria = _output_validator_criteria(validator, allowed, tokenizer, prompt_length)
+        return criteria, allowed, StoppingCriteriaList([criteria])
+
+    def generate(
+        self,
+        query: str,
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> str:
         """
         Generate response using local SLM.
         Tier 2: Called only when no dataset match.
+        If an OutputValidator is given, decoding stops as soon as the output contains a
+        financial figure that is neither in allowed_numbers nor in the query itself,
+        and the validator's fallback response is returned instead.
+        With the scheduler enabled, the request joins the shared continuous batch.
+        max_new_tokens overrides the configured budget (e.g. to fit a deadline).
         """
-        model, tokenizer = self._load_model()
-        prompt = self._format_prompt(query)
-        inputs = tokenizer(prompt, return_tensors="pt")
-        if hasattr(self._model, "device") and self._model.device.type != "cpu":
-            inputs = {k: v.to(self._model.device) for k, v in inputs.items()}
+        with self.pinned():
+            return self.generate_ids(self.query_prompt_ids(query), query, validator, allowed_numbers, max_new_tokens)
+
+    def generate_ids(
+        self,
+        prompt_ids: List[int],
+        query: str = "",
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> str:
+        """Generate from an assembled prompt (see build_prompt_ids); query feeds the output validator."""
+        if self.scheduler is not None:
+            return self.generate_ids_async(prompt_ids, query, validator, allowed_numbers, max_new_tokens).result()
 
-        with __import__("torch").no_grad():
-            outputs = self._model.generate(
-                **inputs,
-                max_new_tokens=self.max_new_tokens,
+        import torch
+
+        with self.pinned() as version:
+            model, tokenizer = version.model, version.tokenizer
+        ids = torch.tensor([prompt_ids], device=model.device)
+        criteria, allowed, stopping_criteria = self._stopping_criteria(
+            validator, allowed_numbers, query, tokenizer, len(prompt_ids)
+        )
+        timer, stopping_criteria = self._timed_criteria(stopping_criteria)
+        with torch.no_grad():
+            outputs = model.generate(
+                input_ids=ids,
+                attention_mask=torch.ones_like(ids),
+                max_new_tokens=max_new_tokens or self.max_new_tokens,
                 temperature=self.temperature,
                 do_sample=True,
                 pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=stopping_criteria,
             )
+        self._record_decode(*timer.decode_time())
+        return self._finalize(outputs[0][len(prompt_ids):], tokenizer, criteria, validator, allowed)
+
+    def _finalize(self, generated_ids, tokenizer, criteria, validator, allowed) -> str:
+        """Decode generated ids into the response, applying the output validator."""
+        if criteria is not None and criteria.violation is not None:
+            return validator.fallback_response
 
-        full_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # Extract response after "### Response:"
-        if "### Response:" in full_text:
-            response = full_text.split("### Response:")[-1].strip()
-        else:
-            response = full_text[len(prompt):].strip()
+        response = tokenizer.decode(generated_ids, skip_special_tokens=True)
+        # Keep only the text after any further "### Response:" marker the model emits
+        if "### Response:" in response:
+            response = response.split("### Response:")[-1]
+        response = response.strip()
+        if criteria is not None and validator.find_violation(response, allowed) is not None:
+            return validator.fallback_response
         return response
+
+    def generate_async(
+        self,
+        query: str,
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> Future:
+        """
+        Submit a generation to the continuous-batching scheduler.
+        Returns a Future resolving to the response text (same semantics as generate()).
+        """
+        with self.pinned():
+            return self.generate_ids_async(self.query_prompt_ids(query), query, validator, allowed_numbers, max_new_tokens)
+
+    def generate_ids_async(
+        self,
+        prompt_ids: List[int],
+        query: str = "",
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> Future:
+        """generate_ids() through the continuous-batching scheduler; returns a Future of the response."""
+        if self.scheduler is None:
+            raise RuntimeError("Generation scheduler is disabled (slm.scheduler.enabled)")
+        with self.pinned() as version:
+            tokenizer = version.tokenizer
+        criteria, allowed, _ = self._stopping_criteria(validator, allowed_numbers, query, tokenizer, len(prompt_ids))
+        request = self.scheduler.submit(
+            prompt_ids, max_new_tokens=max_new_tokens, stopping_criteria=criteria, version=version
+        )
+
+        result: Future = Future()
+
+        def _done(f: Future) -> None:
+            try:
+                self._record_decode(*request.decode_time())
+                result.set_result(self._finalize(f.result(), tokenizer, criteria, validator, allowed))
+            except Exception as e:
+                result.set_exception(e)
+
+        request.future.add_done_callback(_done)
+        return result
+
+    def stream(
+        self,
+        query: str,
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        Yield response text incrementally as the scheduler decodes it.
+        With an OutputValidator, every chunk is checked before it is yielded and a
+        number near the end of the text is held back until its unit is complete.
+        On an ungrounded figure decoding stops and the stream ends with the
+        validator's fallback response (after a blank line if text was already sent).
+        """
+        if self.scheduler is None:
+            raise RuntimeError("Generation scheduler is disabled (slm.scheduler.enabled)")
+        with self.pinned() as version:
+            tokenizer = version.tokenizer
+            prompt_ids = self.query_prompt_ids(query)
+            criteria, allowed, _ = self._stopping_criteria(validator, allowed_numbers, query, tokenizer, len(prompt_ids))
+            request = self.scheduler.submit(
+                prompt_ids, max_new_tokens=max_new_tokens, stopping_criteria=criteria, stream=True, version=version
+            )
+        emitted = ""
+        done = False
+        for _ in self.scheduler.stream(request):
+            if done:
+                continue
+            text = tokenizer.decode(request.generated, skip_special_tokens=True)
+            if criteria is not None and validator.find_violation(text, allowed, final=False) is not None:
+                done = True
+                continue
+            safe = len(text) if criteria is None else _held_back_length(text)
+            # Hold back partial multi-byte characters until they complete
+            if text.startswith(emitted) and safe > len(emitted) and not text[:safe].endswith("\ufffd"):
+                yield text[len(emitted):safe]
+                emitted = text[:safe]
+        text = tokenizer.decode(request.generated, skip_special_tokens=True)
+        if criteria is not None and (done or validator.find_violation(text, allowed) is not None):
+            yield ("\n\n" if emitted else "") + validator.fallback_response
+            return
+        if len(text) > len(emitted) and text.startswith(emitted):
+            yield text[len(emitted):]
+
+    def generate_cached(
+        self,
+        input_ids: List[int],
+        past_key_values=None,
+        query: str = "",
+        validator=None,
+        allowed_numbers: Optional[set] = None,
+        max_new_tokens: Optional[int] = None,
+    ):
+        """
+        Continue input_ids, reusing past_key_values for the prefix they cover so only
+        the uncached suffix (e.g. the newest conversation turn) is prefilled.
+        Returns (response, sequence_ids, past_key_values). On a validator abort the
+        fallback response is returned with a None cache, since the cache holds the
+        discarded tokens.
+        """
+        import torch
+
+        with self.pinned() as version:
+            model, tokenizer = version.model, version.tokenizer
+        ids = torch.tensor([input_ids], device=model.device)
+        criteria, allowed, stopping_criteria = self._stopping_criteria(
+            validator, allowed_numbers, query, tokenizer, len(input_ids)
+        )
+        timer, stopping_criteria = self._timed_criteria(stopping_criteria)
+        with torch.no_grad():
+            outputs = model.generate(
+                input_ids=ids,
+                attention_mask=torch.ones_like(ids),
+                past_key_values=past_key_values,
+                max_new_tokens=max_new_tokens or self.max_new_tokens,
+                temperature=self.temperature,
+                do_sample=True,
+                pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=stopping_criteria,
+                return_dict_in_generate=True,
+                use_cache=True,
+            )
+        sequence = outputs.sequences[0].tolist()
+        self._record_decode(*timer.decode_time())
+        response = tokenizer.decode(sequence[len(input_ids):], skip_special_tokens=True).strip()
+        if criteria is not None and (
+            criteria.violation is not None or validator.find_violation(response, allowed) is not None
+        ):
+            return validator.fallback_response, None, None
+        return response, sequence, outputs.past_key_values